@@ -1,25 +1,34 @@
 import os
+import sys
 import io
 import base64
 import json
 import threading
-import mimetypes
+import time
 import logging
+import importlib
+import multiprocessing
+import sqlite3
+import re
+import hashlib
+import zlib
+import tempfile
+import random
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash, send_from_directory
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash, send_file, Response, stream_with_context, g, has_request_context
 from dotenv import load_dotenv
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.security import generate_password_hash, check_password_hash
-from google.oauth2 import service_account
-from google_auth_oauthlib.flow import Flow
-from google.auth.transport.requests import Request as AuthRequest
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload, MediaFileUpload, MediaIoBaseDownload
-from reportlab.pdfgen import canvas as pdf_canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.utils import ImageReader
-from PyPDF2 import PdfReader, PdfWriter
 from googleapiclient.errors import HttpError
+# Library Google (klien Drive, OAuth) dan library PDF (PyPDF2, ReportLab, Pillow) diimpor
+# saat pertama dipakai agar worker gunicorn cepat siap; warmup() dapat memuatnya lebih awal.
 
 # Muat variabel dari file .env
 load_dotenv()
@@ -48,180 +57,2046 @@ OAUTH_SCOPES = [
 app = Flask(__name__)
 app.secret_key = SECRET_KEY
 
+# Batas ukuran request (MB); request yang lebih besar ditolak dengan 413 sebelum dibaca
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "100"))
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_MB * 1024 * 1024
+# Ukuran chunk upload resumable ke Drive (kelipatan 256 KB)
+UPLOAD_CHUNK_SIZE = max(256 * 1024, int(os.getenv("UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024))) // (256 * 1024) * (256 * 1024))
+# Jumlah file yang diunggah ke Drive secara bersamaan (dibagi oleh semua request di satu worker)
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))
+
 # Direktori untuk file sementara
 TEMP_DIR = "temp"
 if not os.path.exists(TEMP_DIR):
     os.makedirs(TEMP_DIR)
 
-# Objek global untuk melacak status unduhan file
-DOWNLOAD_STATUS = {}
+# Batas ukuran cache PDF di TEMP_DIR (MB)
+PDF_CACHE_MAX_MB = int(os.getenv("PDF_CACHE_MAX_MB", "512"))
+# Cara menyimpan PDF yang ditandatangani: "incremental" (menambahkan update di akhir file)
+# atau "rewrite" (menulis ulang seluruh dokumen dengan PyPDF2)
+PDF_SAVE_MODE = os.getenv("PDF_SAVE_MODE", "incremental")
+# Penempelan tanda tangan dijalankan di thread pemanggil ("thread") atau di pool proses
+# terpisah ("process") agar PDF besar tidak menahan GIL worker gunicorn. Mode process:
+# jumlah proses, batas waktu per dokumen (detik), dan batas memori per proses (MB, 0 = tanpa batas)
+PDF_STAMP_EXECUTOR = os.getenv("PDF_STAMP_EXECUTOR", "thread")
+PDF_STAMP_PROCESSES = int(os.getenv("PDF_STAMP_PROCESSES", str(os.cpu_count() or 2)))
+PDF_STAMP_TIMEOUT = float(os.getenv("PDF_STAMP_TIMEOUT", "120"))
+PDF_STAMP_MEMORY_MB = int(os.getenv("PDF_STAMP_MEMORY_MB", "1024"))
+# Jika file belum ada di cache, download_pdf meneruskan isi file langsung dari Drive per chunk
+PDF_PROXY_STREAM = os.getenv("PDF_PROXY_STREAM", "false").lower() == "true"
+
+# Direktori data lokal (SQLite untuk status job yang dibagi antar worker)
+DATA_DIR = os.getenv("DATA_DIR", "data")
+# Sesi disimpan di server ("sqlite", dibagi antar worker gunicorn) dan cookie hanya berisi ID acak;
+# "cookie" memakai sesi cookie bertanda tangan bawaan Flask. SESSION_LIFETIME: masa berlaku sesi
+# sejak aktivitas terakhir (detik)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "sqlite")
+SESSION_LIFETIME = int(os.getenv("SESSION_LIFETIME", str(12 * 3600)))
+
+# Alur persetujuan (grup folder di halaman utama, tahap awal/akhir, dan tabel transisi per kode
+# pengajuan) dibaca sekali saat start dari file JSON ini; jika kosong dipakai DEFAULT_WORKFLOW
+WORKFLOW_FILE = os.getenv("WORKFLOW_FILE")
+
+# Aset tanda tangan yang sudah dinormalisasi, disimpan sebagai <sha256>.png dan dibagi antar worker.
+# SIGNATURE_SCALE adalah resolusi gambar relatif terhadap kotak tanda tangan 150x50 pt.
+# SIGNATURE_MAX_PIXELS membatasi ukuran gambar unggahan sebelum didekode; tanda tangan yang tidak
+# dipakai selama SIGNATURE_MAX_AGE_DAYS hari dihapus, dan jumlah file dibatasi SIGNATURE_MAX_FILES
+SIGNATURE_DIR = os.getenv("SIGNATURE_DIR", os.path.join(DATA_DIR, "signatures"))
+SIGNATURE_SCALE = float(os.getenv("SIGNATURE_SCALE", "2"))
+SIGNATURE_MAX_PIXELS = int(os.getenv("SIGNATURE_MAX_PIXELS", str(8_000_000)))
+SIGNATURE_MAX_AGE_DAYS = float(os.getenv("SIGNATURE_MAX_AGE_DAYS", "30"))
+SIGNATURE_MAX_FILES = int(os.getenv("SIGNATURE_MAX_FILES", "5000"))
+
+# Pengaturan job unduhan: jumlah worker, masa simpan status job yang sudah selesai (detik),
+# backend status ("memory" per worker atau "sqlite" yang dibagi antar worker gunicorn)
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "4"))
+DOWNLOAD_STATUS_TTL = int(os.getenv("DOWNLOAD_STATUS_TTL", "600"))
+DOWNLOAD_STATUS_BACKEND = os.getenv("DOWNLOAD_STATUS_BACKEND", "memory")
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(2 * 1024 * 1024)))
+# Pengaturan antrean penandatanganan: jumlah worker, masa simpan status,
+# dan backend status (default sama dengan backend status unduhan)
+SIGN_WORKERS = int(os.getenv("SIGN_WORKERS", "2"))
+SIGN_STATUS_TTL = int(os.getenv("SIGN_STATUS_TTL", "3600"))
+SIGN_STATUS_BACKEND = os.getenv("SIGN_STATUS_BACKEND", DOWNLOAD_STATUS_BACKEND)
+# Batas jumlah dokumen dalam satu permintaan tanda tangan massal
+BULK_SIGN_MAX_FILES = int(os.getenv("BULK_SIGN_MAX_FILES", "100"))
+# Lama maksimum satu koneksi Server-Sent Events progres unduhan sebelum browser menyambung ulang
+DOWNLOAD_EVENTS_MAX_WAIT = int(os.getenv("DOWNLOAD_EVENTS_MAX_WAIT", "60"))
+# Batas koneksi SSE bersamaan per worker; selebihnya dijawab 503 dan halaman loading kembali ke
+# polling /check_ready. Di worker gthread setiap stream menahan satu thread request, jadi bawaannya
+# kecil; di worker gevent (socket sudah di-patch) stream hanya menahan satu greenlet
+_gevent_monkey = sys.modules.get("gevent.monkey")
+RUNNING_UNDER_GEVENT = _gevent_monkey is not None and _gevent_monkey.is_module_patched("socket")
+DOWNLOAD_EVENTS_MAX_STREAMS = int(os.getenv("DOWNLOAD_EVENTS_MAX_STREAMS", "1000" if RUNNING_UNDER_GEVENT else "2"))
+
+# Lapisan panggilan Drive: percobaan ulang untuk error sementara (429, 5xx, jaringan) dengan
+# exponential backoff + jitter, batas laju per worker (request/detik dan burst; bagi kuota
+# proyek dengan jumlah worker gunicorn), dan circuit breaker yang menolak panggilan untuk
+# sementara setelah sejumlah kegagalan berturut-turut
+DRIVE_RETRIES = int(os.getenv("DRIVE_RETRIES", "5"))
+DRIVE_BACKOFF_BASE = float(os.getenv("DRIVE_BACKOFF_BASE", "1"))
+DRIVE_BACKOFF_MAX = float(os.getenv("DRIVE_BACKOFF_MAX", "32"))
+DRIVE_RATE_LIMIT = float(os.getenv("DRIVE_RATE_LIMIT", "20"))
+DRIVE_RATE_BURST = int(os.getenv("DRIVE_RATE_BURST", "40"))
+DRIVE_BREAKER_THRESHOLD = int(os.getenv("DRIVE_BREAKER_THRESHOLD", "10"))
+DRIVE_BREAKER_RESET = float(os.getenv("DRIVE_BREAKER_RESET", "30"))
+# Panggilan Drive yang saling lepas dalam satu request (mis. halaman lanjutan daftar folder di
+# halaman utama, listing per folder saat sinkronisasi indeks) dijalankan bersamaan oleh pool ini.
+# Di worker gevent, thread pool ini menjadi greenlet.
+DRIVE_IO_WORKERS = int(os.getenv("DRIVE_IO_WORKERS", "8"))
+
+# Cache daftar file per folder (detik). Setiap worker gunicorn punya cache sendiri,
+# jadi TTL membatasi seberapa lama data bisa basi di worker lain. Setiap halaman (token) disimpan
+# sebagai entri sendiri, jadi jumlah entri dibatasi FOLDER_CACHE_MAX_ENTRIES (LRU).
+FOLDER_CACHE_TTL = int(os.getenv("FOLDER_CACHE_TTL", "60"))
+FOLDER_CACHE_MAX_ENTRIES = int(os.getenv("FOLDER_CACHE_MAX_ENTRIES", "1000"))
+_folder_cache = OrderedDict()
+_folder_cache_lock = threading.Lock()
+
+# Ukuran halaman dan field mask untuk daftar file di folder
+FOLDER_PAGE_SIZE = int(os.getenv("FOLDER_PAGE_SIZE", "100"))
+FILE_LIST_FIELDS = os.getenv("FILE_LIST_FIELDS", "id, name, parents, mimeType, modifiedTime, size")
+
+# Muat library berat dan siapkan klien Drive di latar belakang setelah worker gunicorn siap
+# (lihat gunicorn.conf.py). Jika dimatikan, semuanya dimuat saat pertama dipakai.
+WARMUP_ON_START = os.getenv("WARMUP_ON_START", "true").lower() == "true"
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 
+# Endpoint /metrics (format Prometheus). Jika METRICS_TOKEN diisi, scraper harus mengirim
+# "Authorization: Bearer <token>". METRICS_SERVER_TIMING=true menambahkan header Server-Timing
+# (durasi total dan waktu panggilan Drive) ke setiap respons.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+METRICS_SERVER_TIMING = os.getenv("METRICS_SERVER_TIMING", "false").lower() == "true"
+
+class MetricsRegistry:
+    """Registry metrik sederhana (counter, histogram, gauge) yang dirender dalam format teks Prometheus.
+
+    Nilai disimpan per proses; dengan beberapa worker gunicorn setiap scrape membaca satu worker.
+    """
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self._metrics = OrderedDict()
+        self._lock = threading.Lock()
+
+    def counter(self, name, help):
+        self._metrics[name] = {"type": "counter", "help": help, "values": {}}
+
+    def histogram(self, name, help, buckets=None):
+        self._metrics[name] = {"type": "histogram", "help": help, "values": {},
+                               "buckets": tuple(buckets or self.DEFAULT_BUCKETS)}
+
+    def gauge(self, name, help, collect):
+        """collect() dipanggil saat render dan mengembalikan daftar (label, nilai)."""
+        self._metrics[name] = {"type": "gauge", "help": help, "collect": collect}
+
+    def inc(self, name, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        metric = self._metrics[name]
+        with self._lock:
+            metric["values"][key] = metric["values"].get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        metric = self._metrics[name]
+        with self._lock:
+            entry = metric["values"].get(key)
+            if entry is None:
+                entry = metric["values"][key] = {"buckets": [0] * len(metric["buckets"]), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(metric["buckets"]):
+                if value <= bound:
+                    entry["buckets"][i] += 1
+            entry["sum"] += value
+            entry["count"] += 1
+
+    @staticmethod
+    def _labels(items):
+        if not items:
+            return ""
+        escaped = []
+        for key, value in items:
+            value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            escaped.append(f'{key}="{value}"')
+        return "{" + ",".join(escaped) + "}"
+
+    def render(self):
+        lines = []
+        for name, metric in self._metrics.items():
+            full_name = self.prefix + name
+            lines.append(f"# HELP {full_name} {metric['help']}")
+            lines.append(f"# TYPE {full_name} {metric['type']}")
+            if metric["type"] == "gauge":
+                try:
+                    samples = list(metric["collect"]())
+                except Exception as e:
+                    logging.error(f"Error saat mengumpulkan metrik {full_name}: {e}")
+                    samples = []
+                for labels, value in samples:
+                    lines.append(f"{full_name}{self._labels(sorted(labels.items()))} {value}")
+                continue
+            with self._lock:
+                values = {key: (dict(value, buckets=list(value["buckets"])) if isinstance(value, dict) else value)
+                          for key, value in metric["values"].items()}
+            for key, value in sorted(values.items()):
+                if metric["type"] == "counter":
+                    lines.append(f"{full_name}{self._labels(key)} {value}")
+                    continue
+                for bound, count in zip(metric["buckets"], value["buckets"]):
+                    lines.append(f"{full_name}_bucket{self._labels(key + (('le', bound),))} {count}")
+                lines.append(f"{full_name}_bucket{self._labels(key + (('le', '+Inf'),))} {value['count']}")
+                lines.append(f"{full_name}_sum{self._labels(key)} {value['sum']}")
+                lines.append(f"{full_name}_count{self._labels(key)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+METRICS = MetricsRegistry("esign_")
+METRICS.histogram("http_request_duration_seconds", "Durasi request per rute (sampai header respons dikirim).")
+METRICS.counter("drive_calls_total", "Panggilan HTTP ke Drive per metode API dan hasilnya (ok, error, retry, rejected).")
+METRICS.histogram("drive_call_duration_seconds", "Durasi satu panggilan HTTP ke Drive per metode API.")
+METRICS.counter("drive_throttled_seconds_total", "Waktu menunggu pembatas laju sebelum memanggil Drive.")
+METRICS.counter("drive_bytes_total", "Byte isi file yang diunduh dari atau diunggah ke Drive.")
+METRICS.histogram("pdf_stamp_duration_seconds", "Durasi penempelan tanda tangan per mode penyimpanan.")
+METRICS.counter("cache_requests_total", "Pencarian cache per cache dan hasilnya (hit, miss).")
+
+class DriveClientPool:
+    """Membuat layanan Drive dari dokumen discovery yang dimuat sekali.
+
+    httplib2 tidak thread-safe, jadi setiap layanan mendapat transport HTTP sendiri.
+    """
+
+    def __init__(self):
+        self._document = None
+        self._lock = threading.Lock()
+
+    def document(self):
+        from googleapiclient.discovery_cache import get_static_doc
+
+        with self._lock:
+            if self._document is None:
+                self._document = json.loads(get_static_doc("drive", "v3"))
+            return self._document
+
+    def build(self, credentials):
+        import google_auth_httplib2
+        from googleapiclient.discovery import build_from_document
+        from googleapiclient.http import build_http
+
+        http = google_auth_httplib2.AuthorizedHttp(credentials, http=build_http())
+        return build_from_document(self.document(), http=http)
+
+class ThreadLocalDriveService:
+    """Proxy layanan Drive: setiap thread (request gunicorn, worker job) memakai layanannya sendiri.
+
+    Di akhir request layanan dikembalikan ke daftar idle (release), sehingga
+    request berikutnya, termasuk greenlet baru di worker gevent, memakai ulang
+    koneksi HTTP yang sudah terbuka alih-alih membuka koneksi TLS baru.
+    """
+
+    MAX_IDLE = 64
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._local = threading.local()
+        self._idle = []
+        self._idle_lock = threading.Lock()
+
+    def get(self):
+        service = getattr(self._local, "service", None)
+        if service is None:
+            with self._idle_lock:
+                service = self._idle.pop() if self._idle else None
+            if service is None:
+                service = self._factory()
+            if service is not None:
+                self._local.service = service
+        return service
+
+    def release(self):
+        service = getattr(self._local, "service", None)
+        if service is None:
+            return
+        self._local.service = None
+        with self._idle_lock:
+            if len(self._idle) < self.MAX_IDLE:
+                self._idle.append(service)
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+class UserCredentialCache:
+    """Kredensial OAuth pengguna per sesi. Token hanya di-refresh saat sudah kedaluwarsa."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id, data):
+        with self._lock:
+            creds = self._entries.get(session_id)
+            # Token yang di-refresh worker lain (tersimpan di sesi) dipakai daripada refresh ulang
+            if (creds is not None and creds.refresh_token == data.get("refresh_token")
+                    and (creds.valid or creds.token == data.get("token"))):
+                self._entries.move_to_end(session_id)
+                return creds
+        creds = credentials_from_dict(data)
+        with self._lock:
+            self._entries[session_id] = creds
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return creds
+
+    def discard(self, session_id):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+def credentials_to_dict(creds):
+    """Bentuk kredensial pengguna yang disimpan di sesi."""
+    return {
+        'token': creds.token,
+        'refresh_token': creds.refresh_token,
+        'id_token': creds.id_token,
+        'token_uri': creds.token_uri,
+        'client_id': creds.client_id,
+        'client_secret': creds.client_secret,
+        'scopes': creds.scopes,
+        'expiry': creds.expiry.isoformat() if creds.expiry else None
+    }
+
+def credentials_from_dict(data):
+    """Membangun ulang kredensial pengguna dari data sesi."""
+    from google.oauth2.credentials import Credentials as UserCredentials
+
+    expiry = data.get('expiry')
+    return UserCredentials(
+        token=data.get('token'),
+        refresh_token=data.get('refresh_token'),
+        id_token=data.get('id_token'),
+        token_uri=data.get('token_uri'),
+        client_id=data.get('client_id'),
+        client_secret=data.get('client_secret'),
+        scopes=data.get('scopes'),
+        expiry=datetime.fromisoformat(expiry) if expiry else None
+    )
+
+class SqliteDatabase:
+    """Dasar penyimpanan SQLite yang dibagi oleh semua worker: satu koneksi per thread, mode WAL."""
+
+    def __init__(self, path, schema):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(schema)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Isi sesi yang disimpan di server; `sid` adalah ID acak yang dikirim sebagai cookie."""
+
+    def __init__(self, initial=None, sid=None, new=False, expires_at=None):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.expires_at = expires_at
+        self.modified = False
+
+class SqliteSessionInterface(SqliteDatabase, SessionInterface):
+    """Sesi Flask di SQLite. Cookie hanya membawa ID sesi, sehingga kredensial OAuth
+    tidak ikut terkirim di setiap request.
+
+    Baris sesi ditulis hanya jika isinya berubah atau masa berlakunya sudah lewat
+    separuh, sehingga polling seperti /check_ready tidak menulis ke database.
+    Sesi kedaluwarsa dibersihkan berkala.
+    """
+
+    serializer = TaggedJSONSerializer()
+    PURGE_INTERVAL = 600
+
+    def __init__(self, path, lifetime):
+        super().__init__(path, "CREATE TABLE IF NOT EXISTS sessions (sid TEXT PRIMARY KEY, data TEXT, expires_at REAL)")
+        self.lifetime = lifetime
+        self._last_purge = 0
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            row = self._connect().execute(
+                "SELECT data, expires_at FROM sessions WHERE sid = ? AND expires_at > ?", (sid, time.time())
+            ).fetchone()
+            if row:
+                return ServerSession(self.serializer.loads(row[0]), sid=sid, expires_at=row[1])
+        return ServerSession(sid=os.urandom(32).hex(), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if not session:
+            if not session.new:
+                with self._connect() as conn:
+                    conn.execute("DELETE FROM sessions WHERE sid = ?", (session.sid,))
+                USER_CREDENTIALS.discard(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        now = time.time()
+        renew = session.expires_at is None or session.expires_at - now < self.lifetime / 2
+        if session.modified or renew:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO sessions (sid, data, expires_at) VALUES (?, ?, ?)",
+                    (session.sid, self.serializer.dumps(dict(session)), now + self.lifetime)
+                )
+            self._maybe_purge(now)
+        if session.new or (session.permanent and renew):
+            response.vary.add("Cookie")
+            response.set_cookie(
+                name, session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+                domain=domain,
+                path=path,
+            )
+
+    def _maybe_purge(self, now):
+        if now - self._last_purge > self.PURGE_INTERVAL:
+            self._last_purge = now
+            with self._connect() as conn:
+                conn.execute("DELETE FROM sessions WHERE expires_at < ?", (now,))
+
+DRIVE_CLIENTS = DriveClientPool()
+USER_CREDENTIALS = UserCredentialCache()
+
+if SESSION_BACKEND == "sqlite":
+    app.session_interface = SqliteSessionInterface(os.path.join(DATA_DIR, "sessions.sqlite3"), SESSION_LIFETIME)
+
+_service_account_creds = None
+_service_account_lock = threading.Lock()
+
+def get_service_account_credentials():
+    """Kredensial akun layanan; dibuat sekali dan dibagi oleh semua layanan."""
+    from google.oauth2 import service_account
+
+    global _service_account_creds
+    with _service_account_lock:
+        if _service_account_creds is None:
+            _service_account_creds = service_account.Credentials.from_service_account_info(
+                GOOGLE_SERVICE_ACCOUNT_JSON,
+                scopes=["https://www.googleapis.com/auth/drive"]
+            )
+        return _service_account_creds
+
 def get_drive_service_sa():
     """Menginisialisasi dan mengembalikan objek layanan Google Drive dengan akun layanan."""
     try:
-        service_creds = service_account.Credentials.from_service_account_info(
-            GOOGLE_SERVICE_ACCOUNT_JSON,
-            scopes=["https://www.googleapis.com/auth/drive"]
-        )
-        return build("drive", "v3", credentials=service_creds)
+        return DRIVE_CLIENTS.build(get_service_account_credentials())
     except Exception as e:
         logging.error(f"Error saat mengautentikasi dengan akun layanan: {e}")
         return None
 
-def get_drive_service_user():
-    """Menginisialisasi dan mengembalikan objek layanan Google Drive dengan kredensial pengguna dari sesi."""
-    creds = None
-    if 'credentials' in session:
-        try:
-            creds = Flow.from_client_config(
-                client_config={
-                    "web": {
-                        "client_id": GOOGLE_CLIENT_ID,
-                        "client_secret": GOOGLE_CLIENT_SECRET,
-                        "redirect_uris": [GOOGLE_REDIRECT_URI],
-                        "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                        "token_uri": "https://oauth2.googleapis.com/token",
-                    }
-                },
-                scopes=OAUTH_SCOPES,
-            ).credentials
-            creds.token = session['credentials']['token']
-            creds.refresh_token = session['credentials']['refresh_token']
-            creds.id_token = session['credentials']['id_token']
-            creds.token_uri = session['credentials']['token_uri']
-            creds.client_id = session['credentials']['client_id']
-            creds.client_secret = session['credentials']['client_secret']
-            creds.scopes = session['credentials']['scopes']
-            creds.expires_in = session['credentials']['expires_in']
-
-            if not creds.valid:
-                creds.refresh(AuthRequest())
-                session['credentials'] = {
-                    'token': creds.token,
-                    'refresh_token': creds.refresh_token,
-                    'id_token': creds.id_token,
-                    'token_uri': creds.token_uri,
-                    'client_id': creds.client_id,
-                    'client_secret': creds.client_secret,
-                    'scopes': creds.scopes,
-                    'expires_in': creds.expires_in
-                }
+def get_user_credentials():
+    """Kredensial pengguna dari sesi, di-refresh jika sudah kedaluwarsa; None jika tidak ada atau rusak."""
+    if 'credentials' not in session:
+        return None
+    # Sesi di server sudah punya ID; sesi cookie diberi ID sendiri untuk kunci cache kredensial
+    session_id = getattr(session, "sid", None) or session.setdefault('session_id', os.urandom(16).hex())
+    try:
+        creds = USER_CREDENTIALS.get(session_id, session['credentials'])
+        if not creds.valid:
+            from google.auth.transport.requests import Request as AuthRequest
 
-        except Exception as e:
-            logging.error(f"Error saat memuat atau me-refresh kredensial pengguna: {e}")
-            session.pop('credentials', None)
-            return None
-    
-    if creds:
-        return build('drive', 'v3', credentials=creds)
-    return None
+            creds.refresh(AuthRequest())
+            session['credentials'] = credentials_to_dict(creds)
+        return creds
+    except Exception as e:
+        logging.error(f"Error saat memuat atau me-refresh kredensial pengguna: {e}")
+        USER_CREDENTIALS.discard(session_id)
+        session.pop('credentials', None)
+        return None
+
+# Layanan Drive akun layanan, satu per thread
+drive_service_sa = ThreadLocalDriveService(get_drive_service_sa)
 
-drive_service_sa = get_drive_service_sa()
+class DriveUnavailableError(Exception):
+    """Circuit breaker Drive sedang terbuka; panggilan ditolak tanpa menghubungi Drive."""
 
-def get_files(folder_id):
-    """Mengambil daftar file di dalam folder Google Drive."""
+def is_transient_error(error):
+    """True untuk error Drive yang layak dicoba ulang (rate limit, 5xx, gangguan jaringan)."""
+    import httplib2
+
+    if isinstance(error, HttpError):
+        if error.resp.status in (429, 500, 502, 503, 504):
+            return True
+        return is_rate_limit_error(error)
+    return isinstance(error, (ConnectionError, TimeoutError, httplib2.HttpLib2Error))
+
+def is_rate_limit_error(error):
+    """True untuk 429 atau 403 rateLimitExceeded/userRateLimitExceeded dari Drive."""
+    if not isinstance(error, HttpError):
+        return False
+    return error.resp.status == 429 or error.resp.status == 403 and (
+        "rateLimitExceeded" in str(error) or "userRateLimitExceeded" in str(error)
+    )
+
+class TokenBucket:
+    """Pembatas laju sisi klien: `rate` token per detik dengan kapasitas `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Menunggu sampai satu token tersedia dan mengembalikan lama menunggu (detik)."""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def drain(self):
+        """Mengosongkan bucket setelah Drive membalas rate limit, agar semua thread ikut melambat."""
+        with self._lock:
+            self._tokens = min(self._tokens, 0.0)
+
+class CircuitBreaker:
+    """Circuit breaker sederhana: closed -> open setelah `threshold` kegagalan berturut-turut,
+    lalu half-open setelah `reset_timeout` detik untuk satu panggilan percobaan."""
+
+    def __init__(self, threshold, reset_timeout):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed" or self.threshold <= 0:
+                return True
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = "half_open"
+                self._trial_running = False
+            if self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                logging.info("Circuit breaker Drive tertutup kembali.")
+            self.state = "closed"
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self.state == "half_open" or (self.threshold > 0 and self._failures >= self.threshold):
+                if self.state != "open":
+                    logging.error(f"Circuit breaker Drive terbuka setelah {self._failures} kegagalan berturut-turut.")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+class DriveCallLayer:
+    """Satu pintu untuk semua panggilan Drive: batas laju, circuit breaker, percobaan ulang
+    dengan exponential backoff + jitter, dan metrik per metode API (lihat METRICS)."""
+
+    def __init__(self, limiter, breaker, retries, backoff_base, backoff_max):
+        self.limiter = limiter
+        self.breaker = breaker
+        self.retries = max(1, retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def call(self, func, method):
+        """Menjalankan func (satu panggilan HTTP ke Drive) dengan semua perlindungan di atas."""
+        for attempt in range(1, self.retries + 1):
+            if not self.breaker.allow():
+                self._record(method, "rejected")
+                raise DriveUnavailableError("Google Drive sedang tidak dapat dihubungi. Silakan coba lagi nanti.")
+            waited = self.limiter.acquire()
+            start = time.monotonic()
+            try:
+                result = func()
+            except Exception as e:
+                elapsed = time.monotonic() - start
+                transient = is_transient_error(e)
+                if transient:
+                    self.breaker.record_failure()
+                else:
+                    # Error seperti 404 berarti Drive sendiri sehat
+                    self.breaker.record_success()
+                if is_rate_limit_error(e):
+                    self.limiter.drain()
+                if not transient or attempt == self.retries:
+                    self._record(method, "error", elapsed, waited)
+                    raise
+                delay = self._backoff(attempt, e)
+                self._record(method, "retry", elapsed, waited)
+                logging.warning(f"Panggilan Drive {method} gagal sementara ({e}), mencoba lagi dalam {delay:.1f} detik.")
+                time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            self._record(method, "ok", time.monotonic() - start, waited)
+            return result
+
+    def _backoff(self, attempt, error):
+        """Full jitter di atas exponential backoff; Retry-After dari Drive dihormati bila ada."""
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)) * (0.5 + random.random() / 2)
+        retry_after = error.resp.get("retry-after") if isinstance(error, HttpError) else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(self.backoff_max, float(retry_after)))
+        return delay
+
+    @staticmethod
+    def _record(method, outcome, seconds=None, throttled=0.0):
+        METRICS.inc("drive_calls_total", method=method, outcome=outcome)
+        if seconds is None:
+            return
+        METRICS.observe("drive_call_duration_seconds", seconds, method=method)
+        if throttled:
+            METRICS.inc("drive_throttled_seconds_total", throttled, method=method)
+        if has_request_context():
+            # Dipakai untuk header Server-Timing request yang sedang berjalan
+            g.drive_seconds = g.get("drive_seconds", 0.0) + seconds
+            g.drive_calls = g.get("drive_calls", 0) + 1
+
+DRIVE_CALLS = DriveCallLayer(
+    TokenBucket(DRIVE_RATE_LIMIT, DRIVE_RATE_BURST),
+    CircuitBreaker(DRIVE_BREAKER_THRESHOLD, DRIVE_BREAKER_RESET),
+    retries=DRIVE_RETRIES,
+    backoff_base=DRIVE_BACKOFF_BASE,
+    backoff_max=DRIVE_BACKOFF_MAX
+)
+
+def drive_execute(request):
+    """request.execute() lewat DRIVE_CALLS; untuk HttpRequest maupun batch request."""
+    result = DRIVE_CALLS.call(request.execute, getattr(request, "methodId", None) or "drive.batch")
+    media = getattr(request, "resumable", None)
+    if media is not None:
+        METRICS.inc("drive_bytes_total", media.size() or 0, direction="upload")
+    return result
+
+def drive_next_chunk(transfer):
+    """transfer.next_chunk() lewat DRIVE_CALLS; untuk MediaIoBaseDownload dan upload resumable.
+
+    Setelah error, next_chunk berikutnya melanjutkan dari posisi terakhir yang diterima Drive.
+    """
+    request = getattr(transfer, "_request", transfer)
+    if hasattr(transfer, "_progress"):
+        # MediaIoBaseDownload
+        before = transfer._progress
+        result = DRIVE_CALLS.call(transfer.next_chunk, getattr(request, "methodId", None) or "drive.media")
+        METRICS.inc("drive_bytes_total", transfer._progress - before, direction="download")
+        return result
+    before = transfer.resumable_progress
+    result = DRIVE_CALLS.call(transfer.next_chunk, getattr(request, "methodId", None) or "drive.media")
+    after = transfer.resumable.size() if result[1] is not None else transfer.resumable_progress
+    METRICS.inc("drive_bytes_total", after - before, direction="upload")
+    return result
+
+DRIVE_IO_EXECUTOR = ThreadPoolExecutor(max_workers=DRIVE_IO_WORKERS, thread_name_prefix="drive-io")
+
+def map_concurrently(func, items):
+    """Seperti map(func, items), tetapi setiap item dijalankan bersamaan di DRIVE_IO_EXECUTOR."""
+    items = list(items)
+    if len(items) <= 1:
+        return [func(item) for item in items]
+    return list(DRIVE_IO_EXECUTOR.map(func, items))
+
+class DriveIndex:
+    """Indeks lokal file di semua folder FOLDERS yang diperbarui dari Drive Changes API.
+
+    Setelah sinkronisasi awal selesai, daftar file, jumlah file, dan metadata
+    dilayani dari memori; panggilan API hanya sebanding dengan jumlah perubahan.
+    """
+
+    FIELDS = "id, name, parents, mimeType, modifiedTime, size, md5Checksum"
+
+    def __init__(self, service_factory, folder_ids, interval=15):
+        self._service_factory = service_factory
+        self._folder_ids = set(folder_ids)
+        self._interval = interval
+        self._files = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._page_token = None
+        self._ready = False
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self._ready
+
+    def start(self):
+        """Menjalankan thread sinkronisasi di latar belakang."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="drive-index", daemon=True)
+            self._thread.start()
+
+    def poll_now(self):
+        """Membangunkan thread sinkronisasi agar segera membaca perubahan terbaru."""
+        self._wakeup.set()
+
+    def upsert(self, file):
+        """Memperbarui satu entri indeks, misalnya dari respons files.update/create."""
+        if not self._ready or not file or "id" not in file:
+            return
+        with self._lock:
+            if file.get("trashed") or not self._folder_ids.intersection(file.get("parents") or []):
+                self._files.pop(file["id"], None)
+            else:
+                self._files[file["id"]] = {k: file[k] for k in file if k != "trashed"}
+
+    def remove(self, file_id):
+        with self._lock:
+            self._files.pop(file_id, None)
+
+    def get(self, file_id):
+        with self._lock:
+            file = self._files.get(file_id)
+            return dict(file) if file else None
+
+    def list_folder(self, folder_id):
+        with self._lock:
+            return [dict(f) for f in self._files.values() if folder_id in f.get("parents", [])]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._files)
+
+    def count(self, folder_id):
+        with self._lock:
+            return sum(1 for f in self._files.values() if folder_id in f.get("parents", []))
+
+    def _run(self):
+        service = None
+        while True:
+            try:
+                if service is None:
+                    service = self._service_factory()
+                if self._page_token is None:
+                    self._full_sync(service)
+                else:
+                    self._poll(service)
+            except HttpError as e:
+                if e.resp.status in (404, 410):
+                    # Token perubahan tidak berlaku lagi: ulangi sinkronisasi penuh
+                    self._page_token = None
+                logging.error(f"Error saat sinkronisasi indeks Drive: {e}")
+            except Exception as e:
+                logging.error(f"Error saat sinkronisasi indeks Drive: {e}")
+            self._wakeup.wait(self._interval)
+            self._wakeup.clear()
+
+    def _full_sync(self, service):
+        # Ambil token lebih dulu supaya perubahan selama listing tidak terlewat
+        start_token = drive_execute(service.changes().getStartPageToken())["startPageToken"]
+        files = {}
+        # Setiap folder di-listing bersamaan, masing-masing dengan layanan (koneksi HTTP) sendiri
+        for folder_files in map_concurrently(self._list_folder_all, self._folder_ids):
+            for file in folder_files:
+                files[file["id"]] = file
+        with self._lock:
+            self._files = files
+        self._page_token = start_token
+        self._ready = True
+        logging.info(f"Indeks Drive tersinkron: {len(files)} file.")
+
+    def _list_folder_all(self, folder_id):
+        service = self._service_factory()
+        folder_files = []
+        page_token = None
+        while True:
+            results = drive_execute(service.files().list(
+                q=f"'{folder_id}' in parents and trashed = false",
+                pageSize=1000,
+                pageToken=page_token,
+                fields=f"nextPageToken, files({self.FIELDS})"
+            ))
+            folder_files.extend(results.get("files", []))
+            page_token = results.get("nextPageToken")
+            if not page_token:
+                return folder_files
+
+    def _poll(self, service):
+        page_token = self._page_token
+        while page_token:
+            results = drive_execute(service.changes().list(
+                pageToken=page_token,
+                pageSize=1000,
+                includeRemoved=True,
+                spaces="drive",
+                fields=f"nextPageToken, newStartPageToken, changes(fileId, removed, file({self.FIELDS}, trashed))"
+            ))
+            for change in results.get("changes", []):
+                if change.get("removed") or not change.get("file"):
+                    self.remove(change["fileId"])
+                else:
+                    self.upsert(change["file"])
+            if "newStartPageToken" in results:
+                self._page_token = results["newStartPageToken"]
+            page_token = results.get("nextPageToken")
+
+# Sinkronisasi indeks lewat Changes API (opsional, aktifkan dengan DRIVE_SYNC_ENABLED=true)
+DRIVE_SYNC_ENABLED = os.getenv("DRIVE_SYNC_ENABLED", "false").lower() == "true"
+DRIVE_SYNC_INTERVAL = float(os.getenv("DRIVE_SYNC_INTERVAL", "15"))
+DRIVE_INDEX = DriveIndex(get_drive_service_sa, FOLDERS.values(), interval=DRIVE_SYNC_INTERVAL)
+# Proses anak (pool penempelan tanda tangan) ikut mengimpor app.py tetapi tidak perlu indeks Drive
+if DRIVE_SYNC_ENABLED and multiprocessing.parent_process() is None:
+    DRIVE_INDEX.start()
+
+def _folder_cache_get(folder_id, kind):
+    """Mengambil entri cache folder yang belum kedaluwarsa."""
+    key = (folder_id, kind)
+    with _folder_cache_lock:
+        entry = _folder_cache.get(key)
+        fresh = entry is not None and entry[0] > time.monotonic()
+        if fresh:
+            _folder_cache.move_to_end(key)
+        elif entry is not None:
+            # Entri kedaluwarsa dibuang, tidak hanya ditimpa, agar token halaman lama tidak menumpuk
+            del _folder_cache[key]
+    METRICS.inc("cache_requests_total", cache="folder", result="hit" if fresh else "miss")
+    return entry[1] if fresh else None
+
+def _folder_cache_set(folder_id, kind, value):
+    """Menyimpan entri cache folder dengan masa berlaku FOLDER_CACHE_TTL."""
+    if FOLDER_CACHE_TTL <= 0:
+        return
+    key = (folder_id, kind)
+    with _folder_cache_lock:
+        _folder_cache[key] = (time.monotonic() + FOLDER_CACHE_TTL, value)
+        _folder_cache.move_to_end(key)
+        while len(_folder_cache) > FOLDER_CACHE_MAX_ENTRIES:
+            _folder_cache.popitem(last=False)
+
+def invalidate_folder_cache(*folder_ids):
+    """Menghapus cache untuk folder tertentu, atau seluruh cache jika tanpa argumen."""
+    DRIVE_INDEX.poll_now()
+    with _folder_cache_lock:
+        if not folder_ids:
+            _folder_cache.clear()
+            return
+        for key in [k for k in _folder_cache if k[0] in folder_ids]:
+            del _folder_cache[key]
+
+def get_files(folder_id, page_size=None, fields=None, page_token=None):
+    """Generator yang mengembalikan file di dalam folder, mengikuti nextPageToken secara lazy."""
+    if DRIVE_INDEX.ready and not page_token:
+        yield from DRIVE_INDEX.list_folder(folder_id)
+        return
+    page_size = page_size or FOLDER_PAGE_SIZE
+    fields = fields or FILE_LIST_FIELDS
+    while True:
+        try:
+            results = drive_execute(drive_service_sa.files().list(
+                q=f"'{folder_id}' in parents and trashed = false",
+                pageSize=page_size,
+                pageToken=page_token,
+                fields=f"nextPageToken, files({fields})"
+            ))
+        except Exception as e:
+            logging.error(f"Error saat mengambil file: {e}")
+            return
+        yield from results.get("files", [])
+        page_token = results.get("nextPageToken")
+        if not page_token:
+            return
+
+def get_files_page(folder_id, page_token=None, page_size=None):
+    """Mengambil satu halaman file di folder beserta token halaman berikutnya."""
+    page_size = page_size or FOLDER_PAGE_SIZE
+    if DRIVE_INDEX.ready and (not page_token or page_token.startswith("idx:")):
+        # Token halaman dari indeks lokal berupa offset, dibedakan dengan prefix "idx:"
+        offset = 0
+        if page_token:
+            try:
+                offset = max(int(page_token[4:]), 0)
+            except ValueError:
+                logging.error(f"Token halaman tidak valid: {page_token!r}")
+        files = DRIVE_INDEX.list_folder(folder_id)
+        next_offset = offset + page_size
+        next_token = f"idx:{next_offset}" if next_offset < len(files) else None
+        return files[offset:next_offset], next_token
+    cache_kind = ("page", page_token, page_size)
+    cached = _folder_cache_get(folder_id, cache_kind)
+    if cached is not None:
+        return cached
     try:
-        results = drive_service_sa.files().list(
+        results = drive_execute(drive_service_sa.files().list(
             q=f"'{folder_id}' in parents and trashed = false",
-            pageSize=100,
-            fields="nextPageToken, files(id, name, parents, mimeType, modifiedTime, size)"
-        ).execute()
-        return results.get("files", [])
+            pageSize=page_size,
+            pageToken=page_token,
+            fields=f"nextPageToken, files({FILE_LIST_FIELDS})"
+        ))
     except Exception as e:
         logging.error(f"Error saat mengambil file: {e}")
-        return []
+        return [], None
+    page = (results.get("files", []), results.get("nextPageToken"))
+    _folder_cache_set(folder_id, cache_kind, page)
+    if not page_token and not page[1]:
+        _folder_cache_set(folder_id, "count", len(page[0]))
+    return page
+
+def get_folder_counts(folder_ids):
+    """Menghitung jumlah file di beberapa folder sekaligus dengan satu batch request Drive."""
+    if DRIVE_INDEX.ready:
+        return {folder_id: DRIVE_INDEX.count(folder_id) for folder_id in folder_ids}
+    counts = {}
+    missing = []
+    for folder_id in folder_ids:
+        cached = _folder_cache_get(folder_id, "count")
+        if cached is not None:
+            counts[folder_id] = cached
+        else:
+            missing.append(folder_id)
+    if not missing:
+        return counts
+
+    def list_request(folder_id):
+        return drive_service_sa.files().list(
+            q=f"'{folder_id}' in parents and trashed = false",
+            pageSize=1000,
+            fields="nextPageToken, files(id)"
+        )
+
+    responses = {}
 
-def get_file_by_id(file_id):
-    """Mengambil metadata file berdasarkan ID-nya."""
+    def on_response(request_id, response, exception):
+        if exception is not None:
+            logging.error(f"Error saat menghitung file di folder {request_id}: {exception}")
+            return
+        responses[request_id] = response
+
+    try:
+        batch = drive_service_sa.new_batch_http_request(callback=on_response)
+        for folder_id in missing:
+            batch.add(list_request(folder_id), request_id=folder_id)
+        drive_execute(batch)
+    except Exception as e:
+        logging.error(f"Error saat menjalankan batch request: {e}")
+
+    def count_remaining(folder_id):
+        # Folder dengan lebih dari 1000 file: halaman berikutnya diikuti, semua folder bersamaan
+        page_token = responses[folder_id].get("nextPageToken")
+        if not page_token:
+            return 0
+        return sum(1 for _ in get_files(folder_id, page_size=1000, fields="id", page_token=page_token))
+
+    answered = [folder_id for folder_id in missing if folder_id in responses]
+    remaining = dict(zip(answered, map_concurrently(count_remaining, answered)))
+    for folder_id in missing:
+        if folder_id not in responses:
+            counts[folder_id] = 0
+            continue
+        count = len(responses[folder_id].get("files", [])) + remaining[folder_id]
+        counts[folder_id] = count
+        _folder_cache_set(folder_id, "count", count)
+    return counts
+
+def get_file_by_id(file_id, fresh=False):
+    """Mengambil metadata file berdasarkan ID-nya.
+
+    fresh=True selalu bertanya ke Drive (melewati indeks lokal), dipakai saat
+    versi file harus dipastikan terbaru, misalnya sebelum menandatangani.
+    """
+    if DRIVE_INDEX.ready and not fresh:
+        file = DRIVE_INDEX.get(file_id)
+        if file:
+            return file
     try:
-        return drive_service_sa.files().get(fileId=file_id, fields="id, name, parents, mimeType").execute()
+        return drive_execute(drive_service_sa.files().get(
+            fileId=file_id, fields="id, name, parents, mimeType, modifiedTime, size, md5Checksum"
+        ))
     except Exception as e:
         logging.error(f"Error saat mengambil file dengan ID {file_id}: {e}")
         return None
 
-def move_file(file_id, new_parent_id):
-    """Memindahkan file dari satu folder ke folder lain."""
-    try:
-        file = drive_service_sa.files().get(fileId=file_id, fields="parents").execute()
-        previous_parents = ",".join(file.get("parents"))
-        drive_service_sa.files().update(
-            fileId=file_id,
-            addParents=new_parent_id,
-            removeParents=previous_parents,
-            fields="id, parents"
-        ).execute()
-        logging.info(f"File {file_id} berhasil dipindahkan ke folder {new_parent_id}.")
+def get_file_version(file_metadata):
+    """Versi konten file di Drive: md5Checksum, atau modifiedTime jika checksum tidak ada."""
+    return file_metadata.get("md5Checksum") or file_metadata.get("modifiedTime") or ""
+
+class PdfCache:
+    """Cache PDF di disk yang dikunci dengan ID file + versi Drive.
+
+    Penulisan bersifat atomik (file sementara lalu rename) dan urutan LRU
+    disimpan lewat mtime file, sehingga cache aman dipakai bersama oleh
+    beberapa worker gunicorn yang berbagi direktori yang sama. Subdirektori
+    "latest" menyimpan penunjuk ke versi terakhir tiap file agar entri bisa
+    dilayani hanya dengan ID file, tanpa bertanya ke Drive.
+    """
+
+    ENTRY_PATTERN = re.compile(r"^[0-9a-f]{64}\.pdf$")
+    # File .part yang masih baru mungkin sedang ditulis worker lain; hanya yang lebih tua dari ini dihapus
+    PART_GRACE_SECONDS = 3600
+
+    def __init__(self, directory, max_bytes):
+        self.directory = os.path.abspath(directory)
+        self.latest_dir = os.path.join(self.directory, "latest")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.latest_dir, exist_ok=True)
+        # Proses anak pool penempel tanda tangan tidak boleh menghapus file yang sedang ditulis induknya
+        if multiprocessing.parent_process() is None:
+            self._sweep()
+
+    @staticmethod
+    def key(file_id, version):
+        return hashlib.sha256(f"{file_id}:{version}".encode()).hexdigest()
+
+    def path_for(self, file_id, version):
+        return os.path.join(self.directory, f"{self.key(file_id, version)}.pdf")
+
+    def get(self, file_id, version):
+        """Mengembalikan path PDF yang sudah ada di cache, atau None."""
+        path = self.path_for(file_id, version)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            METRICS.inc("cache_requests_total", cache="pdf", result="miss")
+            return None
+        METRICS.inc("cache_requests_total", cache="pdf", result="hit")
+        return path
+
+    @contextmanager
+    def open_for_write(self, file_id, version):
+        """Context manager untuk menulis entri baru; entri baru terlihat setelah blok selesai tanpa error."""
+        path = self.path_for(file_id, version)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        try:
+            with io.FileIO(fd, "wb") as f:
+                yield f
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._set_latest(file_id, version)
+        self._evict(keep=path)
+
+    def _latest_path(self, file_id):
+        return os.path.join(self.latest_dir, hashlib.sha256(file_id.encode()).hexdigest())
+
+    def _set_latest(self, file_id, version):
+        fd, tmp_path = tempfile.mkstemp(dir=self.latest_dir, suffix=".part")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"version": version, "key": self.key(file_id, version)}, f)
+        os.replace(tmp_path, self._latest_path(file_id))
+
+    def latest(self, file_id):
+        """Mengembalikan (path, versi, waktu_disimpan) untuk versi terakhir file di cache, atau None."""
+        pointer = self._latest_path(file_id)
+        try:
+            with open(pointer) as f:
+                version = json.load(f)["version"]
+            stored_at = os.path.getmtime(pointer)
+        except (OSError, ValueError, KeyError):
+            METRICS.inc("cache_requests_total", cache="pdf", result="miss")
+            return None
+        path = self.get(file_id, version)
+        if not path:
+            return None
+        return path, version, stored_at
+
+    def put_bytes(self, file_id, version, data):
+        with self.open_for_write(file_id, version) as f:
+            f.write(data)
+        return self.path_for(file_id, version)
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if self.ENTRY_PATTERN.match(name):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def _evict(self, keep=None):
+        with self._lock:
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def _is_live_part(self, path):
+        """True jika path adalah file .part yang baru diubah (mungkin masih ditulis worker lain)."""
+        if not path.endswith(".part"):
+            return False
+        try:
+            return time.time() - os.path.getmtime(path) < self.PART_GRACE_SECONDS
+        except FileNotFoundError:
+            return True
+
+    def _sweep(self):
+        """Menghapus file yatim (unduhan yang terputus atau format lama) saat startup."""
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if os.path.isfile(path) and not self.ENTRY_PATTERN.match(name) and not self._is_live_part(path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logging.error(f"Gagal menghapus file cache lama {path}: {e}")
+        self._evict()
+        # Penunjuk versi yang entrinya sudah tidak ada juga dibuang
+        for name in os.listdir(self.latest_dir):
+            pointer = os.path.join(self.latest_dir, name)
+            if self._is_live_part(pointer):
+                continue
+            try:
+                if not name.endswith(".part"):
+                    with open(pointer) as f:
+                        key = json.load(f)["key"]
+                    if os.path.exists(os.path.join(self.directory, f"{key}.pdf")):
+                        continue
+                os.remove(pointer)
+            except (OSError, ValueError, KeyError) as e:
+                logging.error(f"Gagal membersihkan penunjuk cache {pointer}: {e}")
+
+PDF_CACHE = PdfCache(TEMP_DIR, PDF_CACHE_MAX_MB * 1024 * 1024)
+
+def download_to_cache(file_id, version, progress=None):
+    """Mengunduh file dari Drive langsung ke cache PDF dan mengembalikan path-nya.
+
+    progress, jika diberikan, dipanggil dengan (byte_terunduh, total_byte) setiap chunk.
+    """
+    from googleapiclient.http import MediaIoBaseDownload
+
+    request_file = drive_service_sa.files().get_media(fileId=file_id)
+    with PDF_CACHE.open_for_write(file_id, version) as f:
+        downloader = MediaIoBaseDownload(f, request_file, chunksize=DOWNLOAD_CHUNK_SIZE)
+        done = False
+        while not done:
+            status, done = drive_next_chunk(downloader)
+            if progress and status:
+                progress(status.resumable_progress, status.total_size)
+    return PDF_CACHE.path_for(file_id, version)
+
+def open_pdf(file_metadata):
+    """Membuka PDF dari cache jika versinya sama dengan di Drive, atau mengunduhnya lebih dulu."""
+    file_id = file_metadata["id"]
+    version = get_file_version(file_metadata)
+    path = PDF_CACHE.get(file_id, version)
+    if not path:
+        logging.info(f"File {file_id} versi {version} belum ada di cache, mengunduh dari Drive.")
+        path = download_to_cache(file_id, version)
+    if os.path.getsize(path) == 0:
+        logging.error(f"File {file_id} kosong setelah diunduh.")
+        return None
+    return open(path, "rb")
+
+# State job (unduhan maupun penandatanganan) yang sudah selesai dan boleh dibersihkan setelah TTL
+FINISHED_JOB_STATES = ("ready", "error", "done", "skipped", "failed")
+
+class MemoryStatusStore:
+    """Penyimpanan status job di memori proses; hanya terlihat oleh worker itu sendiri."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            status = self._data.get(key)
+            return dict(status) if status else None
+
+    def set(self, key, status):
+        status = dict(status, updated_at=time.time())
+        with self._lock:
+            self._data[key] = status
+
+    def purge(self, finished_before):
+        """Menghapus status job yang sudah selesai sebelum waktu tertentu."""
+        with self._lock:
+            for key in [k for k, v in self._data.items()
+                        if v["state"] in FINISHED_JOB_STATES and v["updated_at"] < finished_before]:
+                del self._data[key]
+
+class SqliteStatusStore(SqliteDatabase):
+    """Penyimpanan status job di SQLite agar dapat dibaca oleh semua worker gunicorn."""
+
+    def __init__(self, path, table="download_jobs"):
+        super().__init__(
+            path,
+            f"CREATE TABLE IF NOT EXISTS {table} "
+            "(key TEXT PRIMARY KEY, state TEXT, data TEXT, updated_at REAL)"
+        )
+        self.table = table
+
+    def get(self, key):
+        row = self._connect().execute(
+            f"SELECT data, updated_at FROM {self.table} WHERE key = ?", (key,)
+        ).fetchone()
+        if not row:
+            return None
+        return dict(json.loads(row[0]), updated_at=row[1])
+
+    def set(self, key, status):
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, state, data, updated_at) VALUES (?, ?, ?, ?)",
+                (key, status["state"], json.dumps(status), time.time())
+            )
+
+    def purge(self, finished_before):
+        with self._connect() as conn:
+            conn.execute(
+                f"DELETE FROM {self.table} WHERE state IN ({', '.join('?' * len(FINISHED_JOB_STATES))}) "
+                "AND updated_at < ?",
+                (*FINISHED_JOB_STATES, finished_before)
+            )
+
+def create_status_store(backend, table):
+    """Membuat backend status job sesuai konfigurasi ("memory" atau "sqlite")."""
+    if backend == "sqlite":
+        return SqliteStatusStore(os.path.join(DATA_DIR, "jobs.sqlite3"), table=table)
+    return MemoryStatusStore()
+
+class DownloadJobManager:
+    """Menjalankan unduhan di thread pool terbatas dengan de-duplikasi per ID file.
+
+    Status (state, byte terunduh, total byte) ditulis ke status store sehingga
+    check_ready bisa membacanya dari worker mana pun jika backend-nya SQLite.
+    """
+
+    # Job "downloading" tanpa pembaruan progres selama ini dianggap mati (mis. worker restart)
+    STALE_AFTER = 120
+
+    def __init__(self, store, max_workers, ttl):
+        self.store = store
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="download")
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition()
+        self._last_purge = 0
+
+    def start(self, file_id):
+        """Memulai unduhan jika belum ada job aktif untuk file ini. Mengembalikan True jika job baru dibuat."""
+        self._maybe_purge()
+        with self._lock:
+            if file_id in self._inflight:
+                return False
+            status = self.store.get(file_id)
+            if (status and status["state"] == "downloading"
+                    and time.time() - status["updated_at"] < self.STALE_AFTER):
+                # Sedang diunduh oleh worker lain
+                return False
+            self.store.set(file_id, {"state": "downloading", "downloaded": 0, "total": None})
+            future = self._executor.submit(download_file_thread, file_id, self)
+            self._inflight[file_id] = future
+        future.add_done_callback(lambda _: self._finish(file_id))
         return True
-    except HttpError as e:
-        logging.error(f"Error saat memindahkan file: {e}")
-        return False
 
-def download_file_to_bytesio(file_id):
-    """Download file Google Drive ke BytesIO."""
-    fh = io.BytesIO()
-    request = drive_service_sa.files().get_media(fileId=file_id)
-    downloader = MediaIoBaseDownload(fh, request)
-    done = False
-    while not done:
-        _, done = downloader.next_chunk()
-    fh.seek(0)
-
-    if fh.getbuffer().nbytes == 0:
-        logging.error(f"File {file_id} kosong setelah diunduh.")
+    def _finish(self, file_id):
+        with self._lock:
+            self._inflight.pop(file_id, None)
+
+    def status(self, file_id):
+        status = self.store.get(file_id)
+        if status and status["state"] != "downloading" and time.time() - status["updated_at"] > self.ttl:
+            return None
+        return status
+
+    def update(self, file_id, state, downloaded=0, total=None):
+        self.store.set(file_id, {"state": state, "downloaded": downloaded, "total": total})
+        with self._changed:
+            self._changed.notify_all()
+
+    def wait_for_change(self, timeout):
+        """Menunggu pembaruan progres dari job di worker ini, paling lama timeout detik.
+
+        Job yang berjalan di worker lain tidak memberi notifikasi, jadi pemanggil
+        tetap membaca ulang status store setelah fungsi ini kembali.
+        """
+        with self._changed:
+            self._changed.wait(timeout)
+
+    def _maybe_purge(self):
+        now = time.time()
+        if now - self._last_purge > 60:
+            self._last_purge = now
+            self.store.purge(now - self.ttl)
+
+DOWNLOAD_JOBS = DownloadJobManager(
+    create_status_store(DOWNLOAD_STATUS_BACKEND, "download_jobs"),
+    max_workers=DOWNLOAD_WORKERS,
+    ttl=DOWNLOAD_STATUS_TTL
+)
+
+
+class SignatureStamper:
+    """Mesin penempel tanda tangan ke halaman terakhir PDF.
+
+    Gambar tanda tangan disiapkan sekali per isi gambar (dikunci dengan hash)
+    lalu dipakai ulang. Dalam mode "incremental" (bawaan), tanda tangan
+    ditambahkan sebagai incremental update: byte asli disalin apa adanya dan
+    hanya objek gambar, content stream baru, dan halaman terakhir yang ditulis
+    di belakangnya, dengan bagian xref berbentuk sama dengan file asli (tabel
+    klasik atau xref stream). Objek asli, termasuk object stream yang
+    terkompresi, tidak pernah ditulis ulang sehingga file hanya bertambah
+    beberapa KB per tahap persetujuan. Mode "rewrite", atau PDF terenkripsi
+    dan yang xref-nya tidak bisa dibaca, ditulis ulang dengan PyPDF2 memakai
+    overlay seukuran mediabox halaman.
+    """
+
+    # Kotak tanda tangan (x, y, lebar, tinggi) dalam point, relatif ke pojok kiri bawah mediabox
+    BOX = (220, 100, 150, 50)
+    CACHE_SIZE = 32
+
+    def __init__(self, mode="incremental"):
+        self.mode = mode
+        self._images = OrderedDict()
+        self._overlays = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, name, cache, key, build):
+        with self._lock:
+            if key in cache:
+                cache.move_to_end(key)
+                METRICS.inc("cache_requests_total", cache=name, result="hit")
+                return cache[key]
+        METRICS.inc("cache_requests_total", cache=name, result="miss")
+        value = build()
+        with self._lock:
+            cache[key] = value
+            while len(cache) > self.CACHE_SIZE:
+                cache.popitem(last=False)
+        return value
+
+    def stamp(self, input_pdf, signature_bytes):
+        """Menempelkan tanda tangan dan mengembalikan BytesIO berisi PDF baru."""
+        data = input_pdf.read() if hasattr(input_pdf, "read") else bytes(input_pdf)
+        start = time.perf_counter()
+        mode, result = self.render(data, signature_bytes)
+        METRICS.observe("pdf_stamp_duration_seconds", time.perf_counter() - start, mode=mode)
+        return io.BytesIO(result)
+
+    def render(self, data, signature_bytes):
+        """Menempelkan tanda tangan ke byte PDF; mengembalikan (mode yang dipakai, byte PDF baru)."""
+        from PyPDF2 import PdfReader
+
+        digest = hashlib.sha256(signature_bytes).hexdigest()
+        reader = PdfReader(io.BytesIO(data))
+        xref_kind = self._xref_kind(data)
+        if self.mode == "incremental" and not reader.is_encrypted and xref_kind:
+            return "incremental", self._stamp_incremental(data, reader, digest, signature_bytes, xref_kind)
+        return "rewrite", self._stamp_rewrite(reader, digest, signature_bytes)
+
+    # --- Penulisan ulang penuh (fallback) ---
+
+    def _overlay_pdf(self, digest, signature_bytes, mediabox):
+        """Overlay ReportLab seukuran mediabox halaman target, di-cache per gambar dan ukuran."""
+        from PyPDF2 import PdfReader
+        from reportlab.lib.utils import ImageReader
+        from reportlab.pdfgen import canvas as pdf_canvas
+
+        left, bottom = float(mediabox.left), float(mediabox.bottom)
+        width, height = float(mediabox.width), float(mediabox.height)
+
+        def build():
+            buffer = io.BytesIO()
+            c = pdf_canvas.Canvas(buffer, pagesize=(width, height))
+            x, y, w, h = self.BOX
+            c.drawImage(ImageReader(io.BytesIO(signature_bytes)), x=x, y=y, width=w, height=h, mask='auto')
+            c.save()
+            return buffer.getvalue()
+
+        overlay = self._cached("signature_overlay", self._overlays, (digest, width, height), build)
+        page = PdfReader(io.BytesIO(overlay)).pages[0]
+        if left or bottom:
+            page.add_transformation((1, 0, 0, 1, left, bottom))
+        return page
+
+    def _stamp_rewrite(self, reader, digest, signature_bytes):
+        from PyPDF2 import PdfWriter
+
+        output = PdfWriter()
+        last_index = len(reader.pages) - 1
+        for i, page in enumerate(reader.pages):
+            if i == last_index:
+                page.merge_page(self._overlay_pdf(digest, signature_bytes, page.mediabox))
+            output.add_page(page)
+        buffer = io.BytesIO()
+        output.write(buffer)
+        return buffer.getvalue()
+
+    # --- Incremental update ---
+
+    @staticmethod
+    def _startxref(data):
+        position = data.rfind(b"startxref")
+        if position < 0:
+            raise ValueError("startxref tidak ditemukan")
+        return int(data[position + 9:].split()[0])
+
+    OBJECT_HEADER_PATTERN = re.compile(rb"\s*\d+\s+\d+\s+obj")
+    XREF_TYPE_PATTERN = re.compile(rb"/Type\s*/XRef\b")
+
+    def _xref_kind(self, data):
+        """Bentuk bagian xref terakhir: "table", "stream", atau None jika tidak dikenali."""
+        try:
+            offset = self._startxref(data)
+        except ValueError:
+            return None
+        if data[offset:offset + 4] == b"xref":
+            return "table"
+        header = self.OBJECT_HEADER_PATTERN.match(data, offset)
+        if header:
+            stream_start = data.find(b"stream", header.end())
+            if stream_start > 0 and self.XREF_TYPE_PATTERN.search(data, header.end(), stream_start):
+                return "stream"
         return None
-    return fh
 
+    @staticmethod
+    def _subsections(numbers):
+        """Mengelompokkan nomor objek terurut menjadi rentang berurutan (awal, jumlah)."""
+        start = 0
+        while start < len(numbers):
+            end = start
+            while end + 1 < len(numbers) and numbers[end + 1] == numbers[end] + 1:
+                end += 1
+            yield numbers[start], end - start + 1
+            start = end + 1
+
+    def _prepare_image(self, digest, signature_bytes):
+        """Mengubah PNG tanda tangan menjadi data gambar PDF (RGB + alpha) yang sudah dikompres."""
+
+        def build():
+            from PIL import Image as PILImage
+
+            image = PILImage.open(io.BytesIO(signature_bytes))
+            image.load()
+            if image.mode != "RGBA":
+                image = image.convert("RGBA")
+            alpha = image.getchannel("A")
+            has_alpha = alpha.getextrema()[0] < 255
+            return {
+                "width": image.width,
+                "height": image.height,
+                "rgb": zlib.compress(image.convert("RGB").tobytes()),
+                "alpha": zlib.compress(alpha.tobytes()) if has_alpha else None,
+            }
+
+        return self._cached("signature_image", self._images, digest, build)
+
+    @staticmethod
+    def _next_object_number(reader):
+        """Nomor objek baru pertama: /Size trailer atau nomor objek tertinggi yang dikenal + 1."""
+        known = [number for section in reader.xref.values() for number in section]
+        known.extend(reader.xref_objStm)
+        size = int(dict.get(reader.trailer, "/Size", 0))
+        return max([size] + [number + 1 for number in known])
+
+    @staticmethod
+    def _serialize(obj):
+        buffer = io.BytesIO()
+        obj.write_to_stream(buffer, None)
+        return buffer.getvalue()
+
+    @staticmethod
+    def _inherited(page, key):
+        node = page
+        while node is not None:
+            if key in node:
+                return dict.get(node, key)
+            parent = dict.get(node, "/Parent")
+            node = parent.get_object() if parent is not None else None
+        return None
+
+    def _stamp_incremental(self, data, reader, digest, signature_bytes, xref_kind):
+        from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, NumberObject
+
+        image = self._prepare_image(digest, signature_bytes)
+        page = reader.pages[-1]
+        page_ref = page.indirect_reference
+        trailer = reader.trailer
+        next_number = self._next_object_number(reader)
+        objects = []
+
+        def add_stream(header, payload):
+            nonlocal next_number
+            number = next_number
+            next_number += 1
+            header = header + b" /Length " + str(len(payload)).encode()
+            objects.append((number, 0, b"<<" + header + b" >>\nstream\n" + payload + b"\nendstream"))
+            return number
+
+        image_header = (
+            b"/Type /XObject /Subtype /Image /Width %d /Height %d /BitsPerComponent 8 /Filter /FlateDecode"
+            % (image["width"], image["height"])
+        )
+        smask = ""
+        if image["alpha"] is not None:
+            alpha_number = add_stream(image_header + b" /ColorSpace /DeviceGray", image["alpha"])
+            smask = f" /SMask {alpha_number} 0 R"
+        image_number = add_stream(image_header + b" /ColorSpace /DeviceRGB" + smask.encode(), image["rgb"])
+
+        # Sumber daya halaman (bisa diwarisi dari node Pages) disalin dangkal lalu ditambah gambar baru
+        resources = DictionaryObject()
+        inherited_resources = self._inherited(page, "/Resources")
+        if inherited_resources is not None:
+            resources.update(dict.items(inherited_resources.get_object()))
+        xobjects = DictionaryObject()
+        if "/XObject" in resources:
+            xobjects.update(dict.items(dict.get(resources, "/XObject").get_object()))
+        index = 0
+        while f"/Sig{index}" in xobjects:
+            index += 1
+        image_name = f"/Sig{index}"
+        xobjects[NameObject(image_name)] = IndirectObject(image_number, 0, reader)
+        resources[NameObject("/XObject")] = xobjects
+
+        mediabox = page.mediabox
+        x, y, w, h = self.BOX
+        x += float(mediabox.left)
+        y += float(mediabox.bottom)
+        prefix_number = add_stream(b"", b"q")
+        suffix_number = add_stream(b"", f"Q q {w} 0 0 {h} {x:.4f} {y:.4f} cm {image_name} Do Q".encode())
+
+        contents = ArrayObject([IndirectObject(prefix_number, 0, reader)])
+        original_contents = dict.get(page, "/Contents")
+        if original_contents is not None:
+            resolved = original_contents.get_object()
+            if isinstance(resolved, ArrayObject):
+                contents.extend(resolved)
+            else:
+                contents.append(original_contents)
+        contents.append(IndirectObject(suffix_number, 0, reader))
+
+        new_page = DictionaryObject()
+        new_page.update(dict.items(page))
+        new_page[NameObject("/Contents")] = contents
+        new_page[NameObject("/Resources")] = resources
+        objects.append((page_ref.idnum, page_ref.generation, self._serialize(new_page)))
+
+        # Tulis objek baru di belakang byte asli, lalu bagian xref dan trailer yang menunjuk ke xref lama
+        output = io.BytesIO()
+        output.write(data)
+        if not data.endswith(b"\n"):
+            output.write(b"\n")
+        offsets = {}
+        for number, generation, body in objects:
+            offsets[number] = (output.tell(), generation)
+            output.write(b"%d %d obj\n" % (number, generation) + body + b"\nendobj\n")
+
+        new_trailer = DictionaryObject()
+        for key in ("/Root", "/Info", "/ID"):
+            if key in trailer:
+                new_trailer[NameObject(key)] = dict.get(trailer, key)
+        new_trailer[NameObject("/Prev")] = NumberObject(self._startxref(data))
+
+        xref_offset = output.tell()
+        if xref_kind == "table":
+            output.write(b"xref\n")
+            numbers = sorted(offsets)
+            for first, count in self._subsections(numbers):
+                output.write(b"%d %d\n" % (first, count))
+                for number in numbers[numbers.index(first):numbers.index(first) + count]:
+                    offset, generation = offsets[number]
+                    output.write(b"%010d %05d n\r\n" % (offset, generation))
+            new_trailer[NameObject("/Size")] = NumberObject(next_number)
+            output.write(b"trailer\n" + self._serialize(new_trailer))
+        else:
+            # File asli memakai xref stream, jadi bagian update juga berupa xref stream
+            # (baris tipe 1: offset 4 byte, generasi 2 byte)
+            xref_number = next_number
+            offsets[xref_number] = (xref_offset, 0)
+            numbers = sorted(offsets)
+            index = []
+            for first, count in self._subsections(numbers):
+                index.extend((NumberObject(first), NumberObject(count)))
+            rows = b"".join(
+                b"\x01" + offsets[n][0].to_bytes(4, "big") + offsets[n][1].to_bytes(2, "big")
+                for n in numbers
+            )
+            payload = zlib.compress(rows)
+            new_trailer[NameObject("/Type")] = NameObject("/XRef")
+            new_trailer[NameObject("/Size")] = NumberObject(xref_number + 1)
+            new_trailer[NameObject("/W")] = ArrayObject([NumberObject(1), NumberObject(4), NumberObject(2)])
+            new_trailer[NameObject("/Index")] = ArrayObject(index)
+            new_trailer[NameObject("/Filter")] = NameObject("/FlateDecode")
+            new_trailer[NameObject("/Length")] = NumberObject(len(payload))
+            output.write(
+                b"%d 0 obj\n" % xref_number + self._serialize(new_trailer)
+                + b"\nstream\n" + payload + b"\nendstream\nendobj"
+            )
+        output.write(b"\nstartxref\n%d\n%%%%EOF\n" % xref_offset)
+        return output.getvalue()
+
+SIGNATURE_STAMPER = SignatureStamper(mode=PDF_SAVE_MODE)
+
+class StampLimitError(Exception):
+    """Penempelan tanda tangan di pool proses melewati batas waktu atau batas memori."""
+
+# Stamper milik proses anak StampProcessPool, dibuat oleh _stamp_worker_init
+_worker_stamper = None
+
+def _stamp_worker_init(memory_mb, mode):
+    """Inisialisasi proses anak: batas memori (RLIMIT_AS) lalu muat library PDF sekali."""
+    global _worker_stamper
+    if memory_mb:
+        try:
+            import resource
+
+            limit = memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError) as e:
+            logging.error(f"Gagal memasang batas memori proses penempel tanda tangan: {e}")
+    for name in ("PyPDF2", "PyPDF2.generic", "reportlab.pdfgen.canvas", "reportlab.lib.utils", "PIL.Image"):
+        importlib.import_module(name)
+    _worker_stamper = SignatureStamper(mode=mode)
+
+def _stamp_file(input_path, output_path, signature_bytes):
+    """Dijalankan di proses anak: PDF dibaca dari dan ditulis ke file, bukan dikirim lewat pickle."""
+    with open(input_path, "rb") as f:
+        data = f.read()
+    mode, result = _worker_stamper.render(data, signature_bytes)
+    with open(output_path, "wb") as f:
+        f.write(result)
+    return mode
+
+class StampProcessPool:
+    """Pool proses untuk penempelan tanda tangan (PDF_STAMP_EXECUTOR=process).
+
+    Isi PDF berpindah lewat file di temp_dir (salinan di cache PDF dipakai langsung
+    jika ada); hanya path dan gambar tanda tangan yang kecil yang di-pickle. Jumlah
+    job berjalan dibatasi sebanyak proses sehingga batas waktu hanya menghitung
+    waktu proses, bukan antrean. Job yang melewati batas waktu mematikan pool
+    (proses tidak bisa dihentikan satu per satu); job lain yang ikut terhenti
+    dicoba ulang sekali di pool baru.
+    """
+
+    def __init__(self, processes, timeout, memory_mb, temp_dir, mode="incremental"):
+        self.processes = max(1, processes)
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.temp_dir = temp_dir
+        self.mode = mode
+        os.makedirs(temp_dir, exist_ok=True)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.processes)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                from concurrent.futures import ProcessPoolExecutor
+
+                # spawn: proses anak tidak mewarisi thread dan lock milik worker gunicorn
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_stamp_worker_init,
+                    initargs=(self.memory_mb, self.mode),
+                )
+            return self._executor
+
+    def _reset(self, executor):
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+        for process in list(executor._processes.values()):
+            process.kill()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=True)
+
+    def stamp(self, input_pdf, signature_bytes):
+        """Seperti SignatureStamper.stamp, tetapi dijalankan di proses terpisah."""
+        from concurrent.futures import TimeoutError as FutureTimeoutError
+        from concurrent.futures.process import BrokenProcessPool
+
+        input_path = getattr(input_pdf, "name", None)
+        tmp_input = None
+        if not (isinstance(input_path, str) and os.path.isfile(input_path)):
+            fd, tmp_input = tempfile.mkstemp(dir=self.temp_dir, suffix=".part")
+            with os.fdopen(fd, "wb") as f:
+                f.write(input_pdf.read() if hasattr(input_pdf, "read") else bytes(input_pdf))
+            input_path = tmp_input
+        fd, output_path = tempfile.mkstemp(dir=self.temp_dir, suffix=".part")
+        os.close(fd)
+        try:
+            for attempt in range(2):
+                with self._slots:
+                    executor = self._get_executor()
+                    start = time.perf_counter()
+                    try:
+                        mode = executor.submit(_stamp_file, input_path, output_path, signature_bytes).result(self.timeout)
+                    except FutureTimeoutError:
+                        self._reset(executor)
+                        raise StampLimitError(f"Penempelan tanda tangan melebihi batas waktu {self.timeout:g} detik.")
+                    except MemoryError:
+                        raise StampLimitError("Dokumen terlalu besar untuk diproses (batas memori terlampaui).")
+                    except BrokenProcessPool:
+                        # Pool dimatikan oleh job lain yang melewati batas waktu, atau proses anak mati
+                        self._reset(executor)
+                        if attempt:
+                            raise
+                        continue
+                METRICS.observe("pdf_stamp_duration_seconds", time.perf_counter() - start, mode=mode)
+                with open(output_path, "rb") as f:
+                    return io.BytesIO(f.read())
+        finally:
+            for path in (tmp_input, output_path):
+                if path and os.path.exists(path):
+                    os.remove(path)
+
+STAMP_POOL = (
+    StampProcessPool(PDF_STAMP_PROCESSES, PDF_STAMP_TIMEOUT, PDF_STAMP_MEMORY_MB,
+                     os.path.join(TEMP_DIR, "stamp"), mode=PDF_SAVE_MODE)
+    if PDF_STAMP_EXECUTOR == "process" else None
+)
 
 def add_signature_to_pdf(input_pdf_bytesio, signature_data_url):
+    """Tanda tangan bisa berupa data URL PNG atau byte PNG (mis. dari SIGNATURE_STORE)."""
+    stamper = STAMP_POOL or SIGNATURE_STAMPER
     try:
+        if isinstance(signature_data_url, bytes):
+            return stamper.stamp(input_pdf_bytesio, signature_data_url)
         if not signature_data_url or "," not in signature_data_url:
             logging.error("Invalid signature data URL provided.")
             return None
 
         header, encoded_data = signature_data_url.split(",", 1)
         signature_binary_data = base64.b64decode(encoded_data)
+        return stamper.stamp(input_pdf_bytesio, signature_binary_data)
+
+    except StampLimitError:
+        raise
+    except Exception as e:
+        logging.exception("Error saat menambahkan tanda tangan ke PDF. Full traceback:")
+        return None
+
+class SignatureStore:
+    """Penyimpanan gambar tanda tangan yang sudah dinormalisasi, dikunci dengan hash isinya.
+
+    Setiap PNG dari signature_pad dipangkas dari tepi transparan, diperkecil agar
+    muat di kotak tanda tangan, diletakkan di tengah kanvas seukuran kotak, lalu
+    dikompres ulang. Hasilnya disimpan sekali sebagai <sha256>.png dan dipakai
+    ulang oleh semua dokumen (dan oleh cache gambar SignatureStamper).
 
-        sig_pdf_bytesio = io.BytesIO()
-        c = pdf_canvas.Canvas(sig_pdf_bytesio, pagesize=A4)
+    mtime file diperbarui setiap kali tanda tangan dipakai; file yang lama tidak
+    dipakai dihapus, dan jika jumlahnya melebihi max_files yang paling lama dibuang.
+    """
 
+    CLEANUP_INTERVAL = 600
+    # File .part yang lebih tua dari ini adalah sisa penulisan yang terputus
+    PART_GRACE_SECONDS = 3600
+
+    def __init__(self, directory, scale=2, max_pixels=8_000_000, max_age=30 * 86400, max_files=5000):
+        self.directory = directory
+        _, _, width, height = SignatureStamper.BOX
+        self.size = (round(width * scale), round(height * scale))
+        self.max_pixels = max_pixels
+        self.max_age = max_age
+        self.max_files = max_files
+        self._lock = threading.Lock()
+        self._last_cleanup = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def valid_id(signature_id):
+        return isinstance(signature_id, str) and re.fullmatch(r"[0-9a-f]{64}", signature_id) is not None
+
+    def path_for(self, signature_id):
+        return os.path.join(self.directory, f"{signature_id}.png")
+
+    def normalize(self, png_bytes):
+        """Mengembalikan PNG seukuran kotak tanda tangan; ValueError jika gambar kosong atau rusak."""
+        from PIL import Image as PILImage, UnidentifiedImageError
+
+        try:
+            image = PILImage.open(io.BytesIO(png_bytes))
+            # Ukuran dibaca dari header; gambar raksasa ditolak sebelum didekode
+            if image.width * image.height > self.max_pixels:
+                raise ValueError("Gambar tanda tangan tidak valid.")
+            image.load()
+        except (UnidentifiedImageError, PILImage.DecompressionBombError, OSError):
+            raise ValueError("Gambar tanda tangan tidak valid.")
+        image = image.convert("RGBA")
+        bbox = image.getchannel("A").getbbox()
+        if not bbox:
+            raise ValueError("Gambar tanda tangan kosong.")
+        image = image.crop(bbox)
+        image.thumbnail(self.size, PILImage.LANCZOS)
+        canvas = PILImage.new("RGBA", self.size, (0, 0, 0, 0))
+        canvas.paste(image, ((self.size[0] - image.width) // 2, (self.size[1] - image.height) // 2))
+        buffer = io.BytesIO()
+        canvas.save(buffer, "PNG", optimize=True)
+        return buffer.getvalue()
+
+    def put(self, png_bytes):
+        """Menormalisasi dan menyimpan tanda tangan; mengembalikan ID-nya (sha256 hasil normalisasi)."""
+        data = self.normalize(png_bytes)
+        signature_id = hashlib.sha256(data).hexdigest()
+        path = self.path_for(signature_id)
         try:
-            image = ImageReader(io.BytesIO(signature_binary_data))
-            c.drawImage(image, x=220, y=100, width=150, height=50, mask='auto')
-        except Exception as draw_error:
-            logging.error(f"Error drawing image with ReportLab: {draw_error}")
+            os.utime(path)
+        except FileNotFoundError:
+            # Tulis ke file sementara lalu rename agar worker lain tidak membaca file setengah jadi
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._maybe_cleanup()
+        return signature_id
+
+    def get(self, signature_id):
+        """Byte PNG tanda tangan, atau None jika ID tidak dikenal."""
+        if not self.valid_id(signature_id):
             return None
+        path = self.path_for(signature_id)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def _maybe_cleanup(self):
+        now = time.time()
+        with self._lock:
+            if now - self._last_cleanup < self.CLEANUP_INTERVAL:
+                return
+            self._last_cleanup = now
+        self.cleanup()
+
+    def cleanup(self):
+        """Menghapus tanda tangan yang lama tidak dipakai dan yang melebihi max_files."""
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                mtime = os.path.getmtime(path)
+            except FileNotFoundError:
+                continue
+            if name.endswith(".part"):
+                expired = now - mtime > self.PART_GRACE_SECONDS
+            elif name.endswith(".png"):
+                expired = now - mtime > self.max_age
+                if not expired:
+                    entries.append((mtime, path))
+                    continue
+            else:
+                continue
+            if expired:
+                self._remove(path)
+        entries.sort()
+        for _, path in entries[:max(0, len(entries) - self.max_files)]:
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logging.error(f"Gagal menghapus tanda tangan lama {path}: {e}")
+
+SIGNATURE_STORE = SignatureStore(
+    SIGNATURE_DIR,
+    scale=SIGNATURE_SCALE,
+    max_pixels=SIGNATURE_MAX_PIXELS,
+    max_age=SIGNATURE_MAX_AGE_DAYS * 86400,
+    max_files=SIGNATURE_MAX_FILES,
+)
+
+def store_signature_data_url(signature_data_url):
+    """Menyimpan tanda tangan dari data URL ke SIGNATURE_STORE; ValueError jika tidak valid."""
+    if not isinstance(signature_data_url, str) or "," not in signature_data_url:
+        raise ValueError("Format tanda tangan tidak valid.")
+    header, encoded_data = signature_data_url.split(",", 1)
+    try:
+        png_bytes = base64.b64decode(encoded_data, validate=True)
+    except ValueError:
+        raise ValueError("Format tanda tangan tidak valid.")
+    return SIGNATURE_STORE.put(png_bytes)
+
+# Alur bawaan. Kode pengajuan: huruf pertama jenis (S/M/G), huruf kedua grup (R = Rabat, P = PRS).
+DEFAULT_WORKFLOW = {
+    "initial": "01 - Pengajuan Awal",
+    "final": "05 - Final",
+    "groups": {
+        "Pengajuan Awal": ["01 - Pengajuan Awal"],
+        "Rabat": ["02A - SPV HRGA", "03A - SPV", "03B - Manager", "03C - General"],
+        "PRS": ["02B - PAMO", "04A - SPV", "04B - Manager", "04C - General"],
+        "Final": ["05 - Final"],
+    },
+    "transitions": {
+        "01 - Pengajuan Awal": {
+            "SR": "02A - SPV HRGA", "MR": "02B - PAMO", "GR": "02B - PAMO",
+            "SP": "02A - SPV HRGA", "MP": "02A - SPV HRGA", "GP": "02A - SPV HRGA",
+        },
+        "02A - SPV HRGA": {"SR": "03A - SPV", "MR": "03B - Manager", "GR": "03C - General"},
+        "02B - PAMO": {"SP": "04A - SPV", "MP": "04B - Manager", "GP": "04C - General"},
+        "03A - SPV": {"SR": "05 - Final"},
+        "03B - Manager": {"MR": "05 - Final"},
+        "03C - General": {"GR": "05 - Final"},
+        "04A - SPV": {"SP": "05 - Final"},
+        "04B - Manager": {"MP": "05 - Final"},
+        "04C - General": {"GP": "05 - Final"},
+    },
+}
+
+class Workflow:
+    """Alur persetujuan yang dikompilasi sekali dari definisi deklaratif.
+
+    Indeks ID <-> nama folder, daftar grup untuk halaman utama, dan tabel
+    transisi (tahap, kode pengajuan) -> (nama, ID) folder tujuan disiapkan di
+    __init__, sehingga setiap pencarian saat request cukup satu lookup dict.
+    Tahap yang tidak ada di FOLDERS dilewati (dengan log) agar lingkungan
+    pengembangan dengan folder sebagian tetap bisa berjalan.
+    """
+
+    def __init__(self, definition, folders):
+        self.initial = definition["initial"]
+        self.final = definition["final"]
+        self.id_by_name = dict(folders)
+        self.name_by_id = {folder_id: name for name, folder_id in folders.items()}
+
+        self.groups = []
+        for group_name, names in definition["groups"].items():
+            members = [(name, folders[name]) for name in names if name in folders]
+            self.groups.append((group_name, members))
+        self.folder_ids = [folder_id for _, members in self.groups for _, folder_id in members]
+
+        self.transitions = {}
+        for stage, targets in definition["transitions"].items():
+            for code, target in targets.items():
+                if stage not in folders or target not in folders:
+                    logging.error(f"Transisi alur {stage} --{code}--> {target} dilewati: folder tidak ada di FOLDERS.")
+                    continue
+                self.transitions[(stage, code.upper())] = (target, folders[target])
+
+    @classmethod
+    def load(cls, path, folders):
+        """Membaca definisi alur dari file JSON, atau DEFAULT_WORKFLOW jika path kosong."""
+        if not path:
+            return cls(DEFAULT_WORKFLOW, folders)
+        try:
+            with open(path, encoding="utf-8") as f:
+                return cls(json.load(f), folders)
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            raise ValueError(f"Definisi alur {path} tidak valid: {e}")
 
-        c.save()
-        sig_pdf_bytesio.seek(0)
+    def folder_name(self, folder_id):
+        return self.name_by_id.get(folder_id)
 
-        input_pdf = PdfReader(input_pdf_bytesio)
-        sig_pdf = PdfReader(sig_pdf_bytesio)
+    def folder_id(self, folder_name):
+        return self.id_by_name.get(folder_name)
 
-        output = PdfWriter()
-        for i in range(len(input_pdf.pages)):
-            page = input_pdf.pages[i]
-            if i == len(input_pdf.pages) - 1:
-                page.merge_page(sig_pdf.pages[0])
-            output.add_page(page)
+    def next_stage(self, stage, code):
+        """(nama, ID) folder tujuan untuk dokumen berkode `code` di tahap `stage`, atau (None, None)."""
+        return self.transitions.get((stage, (code or "").upper()), (None, None))
 
-        signed_bytesio = io.BytesIO()
-        output.write(signed_bytesio)
-        signed_bytesio.seek(0)
-        return signed_bytesio
+    @staticmethod
+    def code_from_filename(filename):
+        """Kode pengajuan dari nama file, untuk dokumen yang belum punya catatan status.
 
-    except Exception as e:
-        logging.exception("Error saat menambahkan tanda tangan ke PDF. Full traceback:")
-        return None
+        Nama file setelah tahap awal berbentuk "<yy>/<mm> <kode><perusahaan> - <nama asli>",
+        dan kode adalah dua huruf pertama token kedua.
+        """
+        match = re.match(r"^\S+\s+([A-Za-z]{2})", filename or "")
+        return match.group(1).upper() if match else None
+
+WORKFLOW = Workflow.load(WORKFLOW_FILE, FOLDERS)
+
+class DocumentStateStore(SqliteDatabase):
+    """Catatan status per dokumen di SQLite: kode pengajuan, tahap saat ini, dan riwayat perpindahan.
+
+    Kode pengajuan dicatat saat dokumen meninggalkan tahap awal, sehingga tahap
+    berikutnya tidak perlu menebaknya dari nama file. Dibagi oleh semua worker gunicorn.
+    """
+
+    def __init__(self, path):
+        super().__init__(
+            path,
+            "CREATE TABLE IF NOT EXISTS documents "
+            "(file_id TEXT PRIMARY KEY, type_code TEXT, stage TEXT, history TEXT, updated_at REAL)"
+        )
+
+    def get(self, file_id):
+        row = self._connect().execute(
+            "SELECT type_code, stage, history, updated_at FROM documents WHERE file_id = ?", (file_id,)
+        ).fetchone()
+        if not row:
+            return None
+        return {"type_code": row[0], "stage": row[1], "history": json.loads(row[2]), "updated_at": row[3]}
+
+    def record(self, file_id, type_code, from_stage, to_stage):
+        """Mencatat perpindahan dokumen dari satu tahap ke tahap berikutnya."""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT history FROM documents WHERE file_id = ?", (file_id,)).fetchone()
+            history = json.loads(row[0]) if row else []
+            history.append({"from": from_stage, "to": to_stage, "at": now})
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (file_id, type_code, stage, history, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (file_id, type_code, to_stage, json.dumps(history), now)
+            )
+
+DOCUMENT_STATES = DocumentStateStore(os.path.join(DATA_DIR, "workflow.sqlite3"))
 
 def get_folder_name_by_id(folder_id):
     """Mencari nama folder berdasarkan ID."""
-    for name, id in FOLDERS.items():
-        if id == folder_id:
-            return name
-    return None
+    return WORKFLOW.folder_name(folder_id)
 
 # ==============================================================================
 #                                ROUTING APLIKASI
@@ -229,25 +2104,15 @@ def get_folder_name_by_id(folder_id):
 @app.route("/")
 def index():
     """Halaman utama, menampilkan daftar folder berdasarkan grup."""
-    folder_groups = {
-        "Pengajuan Awal": ["01 - Pengajuan Awal"],
-        "Rabat": ["02A - SPV HRGA", "03A - SPV", "03B - Manager", "03C - General"],
-        "PRS": ["02B - PAMO", "04A - SPV", "04B - Manager", "04C - General"],
-        "Final": ["05 - Final"]
+    counts = get_folder_counts(WORKFLOW.folder_ids)
+
+    group_data = {
+        group_name: [
+            {"name": folder_name, "id": folder_id, "count": counts.get(folder_id, 0)}
+            for folder_name, folder_id in members
+        ]
+        for group_name, members in WORKFLOW.groups
     }
-    
-    group_data = {}
-    for group_name, folders_in_group in folder_groups.items():
-        group_data[group_name] = []
-        for folder_name in folders_in_group:
-            folder_id = FOLDERS.get(folder_name)
-            if folder_id:
-                files = get_files(folder_id)
-                group_data[group_name].append({
-                    "name": folder_name,
-                    "id": folder_id,
-                    "count": len(files)
-                })
 
     return render_template("index.html", group_data=group_data)
 
@@ -274,9 +2139,21 @@ def view_folder(folder_id):
     if not session.get("logged_in") or session.get("folder_id") != folder_id:
         return render_template("password.html", folder_id=folder_id, folder_name=folder_name)
 
-    files = get_files(folder_id)
-    is_pengajuan_awal = folder_name == "01 - Pengajuan Awal"
-    return render_template("folder.html", files=files, folder_id=folder_id, is_pengajuan_awal=is_pengajuan_awal)
+    page_token = request.args.get("page_token")
+    files, next_page_token = get_files_page(folder_id, page_token=page_token)
+    is_pengajuan_awal = folder_name == WORKFLOW.initial
+    # Tanda tangan massal hanya untuk tahap persetujuan; Pengajuan Awal butuh isian per dokumen
+    can_bulk_sign = folder_name not in (WORKFLOW.initial, WORKFLOW.final)
+    return render_template(
+        "folder.html",
+        files=files,
+        folder_id=folder_id,
+        folder_name=folder_name,
+        is_pengajuan_awal=is_pengajuan_awal,
+        can_bulk_sign=can_bulk_sign,
+        page_token=page_token,
+        next_page_token=next_page_token
+    )
 
 # --- Rute untuk OAuth 2.0 ---
 @app.route("/authorize")
@@ -296,6 +2173,8 @@ def authorize():
     }
     
     # Gunakan Flow.from_client_config() karena Anda sudah memiliki data dalam bentuk dictionary
+    from google_auth_oauthlib.flow import Flow
+
     flow = Flow.from_client_config(
         flow_data,
         scopes=OAUTH_SCOPES,
@@ -327,6 +2206,8 @@ def oauth2callback():
     }
     
     # Gunakan Flow.from_client_config() juga di sini
+    from google_auth_oauthlib.flow import Flow
+
     flow = Flow.from_client_config(
         flow_data,
         scopes=OAUTH_SCOPES,
@@ -336,17 +2217,7 @@ def oauth2callback():
     
     try:
         flow.fetch_token(authorization_response=request.url)
-        creds = flow.credentials
-        session['credentials'] = {
-            'token': creds.token,
-            'refresh_token': creds.refresh_token,
-            'id_token': creds.id_token,
-            'token_uri': creds.token_uri,
-            'client_id': creds.client_id,
-            'client_secret': creds.client_secret,
-            'scopes': creds.scopes,
-            'expires_in': creds.expires_in
-        }
+        session['credentials'] = credentials_to_dict(flow.credentials)
         flash("Otentikasi Google berhasil!", "success")
     except Exception as e:
         logging.error(f"Otentikasi OAuth gagal: {e}")
@@ -355,6 +2226,87 @@ def oauth2callback():
     target_folder_id = session.pop("folder_id_before_auth", url_for("index"))
     return redirect(url_for("view_folder", folder_id=target_folder_id))
 
+def upload_resumable(upload_request):
+    """Mengirim upload resumable per chunk; chunk yang gagal sementara dilanjutkan dari sesi yang sama."""
+    response = None
+    while response is None:
+        _, response = drive_next_chunk(upload_request)
+    return response
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    """Request melebihi MAX_UPLOAD_MB."""
+    message = f"Ukuran file melebihi batas {MAX_UPLOAD_MB} MB."
+    if request.is_json or request.accept_mimetypes.best == "application/json":
+        return jsonify({"status": "error", "message": message}), 413
+    flash(message, "error")
+    return redirect(request.referrer or url_for("index"))
+
+UPLOAD_EXECUTOR = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="upload")
+
+def describe_upload_error(e):
+    """Status dan pesan untuk error HttpError saat mengunggah; kuota penuh dilaporkan terpisah."""
+    if "storage quota" in str(e):
+        return "quota", "Penyimpanan Google Drive penuh. Silakan cek kuota Anda atau hubungi admin."
+    return "error", f"Error: Gagal mengunggah file. {e}"
+
+def upload_one(service_factory, uploaded_file, target_folder_id):
+    """Mengunggah satu FileStorage ke folder target dan mengembalikan hasilnya per file."""
+    from googleapiclient.http import MediaIoBaseUpload
+
+    filename = secure_filename(uploaded_file.filename)
+    try:
+        # Werkzeug menampung file besar di file sementara, jadi stream-nya dikirim per chunk
+        # tanpa membaca seluruh isi file ke memori
+        media = MediaIoBaseUpload(
+            uploaded_file.stream, mimetype=uploaded_file.content_type, chunksize=UPLOAD_CHUNK_SIZE, resumable=True
+        )
+        created = upload_resumable(service_factory().files().create(
+            body={"name": filename, "parents": [target_folder_id]},
+            media_body=media,
+            fields=DriveIndex.FIELDS
+        ))
+        DRIVE_INDEX.upsert(created)
+        return {"filename": filename, "status": "success", "file_id": created["id"]}
+    except HttpError as e:
+        logging.error(f"Error saat mengunggah file {filename}: {e}")
+        status, message = describe_upload_error(e)
+        return {"filename": filename, "status": status, "message": message}
+    except DriveUnavailableError as e:
+        # Drive yang sedang tidak tersedia bukan tanda kredensial rusak, jadi tidak ditandai unexpected
+        return {"filename": filename, "status": "error", "message": str(e)}
+    except Exception as e:
+        if is_transient_error(e):
+            logging.error(f"Gangguan jaringan saat mengunggah file {filename}: {e}")
+            return {"filename": filename, "status": "error",
+                    "message": "Google Drive sedang bermasalah. Silakan coba lagi nanti."}
+        logging.error(f"Terjadi kesalahan tak terduga saat mengunggah {filename}: {e}")
+        return {"filename": filename, "status": "error", "unexpected": True,
+                "message": "Terjadi kesalahan tak terduga saat mengunggah file."}
+
+def upload_files_to_drive(uploaded_files, target_folder_id, creds=None):
+    """Mengunggah beberapa file secara paralel (dibatasi UPLOAD_WORKERS), urutan hasil sama dengan input.
+
+    Dengan creds, setiap upload memakai layanan Drive pengguna sendiri; tanpa creds memakai akun layanan.
+    """
+    if creds:
+        service_factory = lambda: DRIVE_CLIENTS.build(creds)
+    else:
+        # Proxy thread-local: setiap thread pool memakai layanan akun layanannya sendiri
+        service_factory = lambda: drive_service_sa
+    futures = [
+        UPLOAD_EXECUTOR.submit(upload_one, service_factory, uploaded_file, target_folder_id)
+        for uploaded_file in uploaded_files
+    ]
+    results = [future.result() for future in futures]
+    if any(result["status"] == "success" for result in results):
+        invalidate_folder_cache(target_folder_id)
+    return results
+
+def selected_upload_files():
+    """Semua file di field "file" yang benar-benar dipilih."""
+    return [f for f in request.files.getlist("file") if f and f.filename]
+
 @app.route("/upload_file", methods=["POST"])
 def upload_file():
     target_folder_id = request.form.get("folder_id")
@@ -365,57 +2317,82 @@ def upload_file():
         flash("Silakan login kembali untuk mengunggah file.", "error")
         return redirect(url_for("view_folder", folder_id=target_folder_id))
     
-    if folder_name == "01 - Pengajuan Awal":
+    if folder_name == WORKFLOW.initial:
         if 'credentials' not in session:
             flash("Silakan login dengan akun Google Anda untuk mengunggah file.", "warning")
             return redirect(url_for("authorize", folder_id=target_folder_id))
 
-    try:
-        uploaded_file = request.files.get("file")
-        if not uploaded_file or uploaded_file.filename == "":
-            flash("Tidak ada file yang dipilih.", "error")
-            return redirect(url_for("view_folder", folder_id=target_folder_id))
+    uploaded_files = selected_upload_files()
+    if not uploaded_files:
+        flash("Tidak ada file yang dipilih.", "error")
+        return redirect(url_for("view_folder", folder_id=target_folder_id))
 
-        filename = secure_filename(uploaded_file.filename)
-        mime_type = uploaded_file.content_type
-        
-        file_metadata = {
-            "name": filename,
-            "parents": [target_folder_id]
-        }
-        
-        media = MediaIoBaseUpload(io.BytesIO(uploaded_file.read()), mimetype=mime_type, resumable=True)
-
-        # Gunakan layanan Drive berdasarkan otentikasi
-        if folder_name == "01 - Pengajuan Awal" and 'credentials' in session:
-            drive_service = get_drive_service_user()
-            if not drive_service:
-                flash("Otentikasi Google Anda tidak valid. Silakan coba lagi.", "error")
-                return redirect(url_for("authorize", folder_id=target_folder_id))
-        else:
-            drive_service = drive_service_sa
-        
-        drive_service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields="id"
-        ).execute()
+    # Gunakan layanan Drive berdasarkan otentikasi
+    creds = None
+    if folder_name == WORKFLOW.initial and 'credentials' in session:
+        creds = get_user_credentials()
+        if not creds:
+            flash("Otentikasi Google Anda tidak valid. Silakan coba lagi.", "error")
+            return redirect(url_for("authorize", folder_id=target_folder_id))
 
-        flash(f"File '{filename}' berhasil diunggah.", "success")
-        
-    except HttpError as e:
-        logging.error(f"Error saat mengunggah file: {e}")
-        if "storage quota" in str(e):
-            flash("Penyimpanan Google Drive penuh. Silakan cek kuota Anda atau hubungi admin.", "error")
-        else:
-            flash(f"Error: Gagal mengunggah file. {e}", "error")
-    except Exception as e:
-        logging.error(f"Terjadi kesalahan tak terduga: {e}")
-        flash("Terjadi kesalahan tak terduga saat mengunggah file.", "error")
+    results = upload_files_to_drive(uploaded_files, target_folder_id, creds)
+
+    succeeded = [result for result in results if result["status"] == "success"]
+    if len(succeeded) == 1:
+        flash(f"File '{succeeded[0]['filename']}' berhasil diunggah.", "success")
+    elif succeeded:
+        flash(f"{len(succeeded)} file berhasil diunggah.", "success")
+    for result in results:
+        if result["status"] != "success":
+            flash(f"{result['filename']}: {result['message']}", "error")
+    if any(result.get("unexpected") for result in results):
         session.pop('credentials', None) # Hapus kredensial yang mungkin rusak
 
     return redirect(url_for("view_folder", folder_id=target_folder_id))
 
+@app.route("/upload_files", methods=["POST"])
+def upload_files():
+    """Versi JSON dari upload_file untuk unggahan banyak file lewat XHR, dengan hasil per file."""
+    target_folder_id = request.form.get("folder_id")
+    folder_name = get_folder_name_by_id(target_folder_id)
+
+    if not session.get("logged_in") or session.get("folder_id") != target_folder_id:
+        return jsonify({"status": "error", "message": "Silakan login kembali untuk mengunggah file."}), 403
+    if folder_name == WORKFLOW.initial and 'credentials' not in session:
+        return jsonify({
+            "status": "error",
+            "message": "Silakan login dengan akun Google Anda untuk mengunggah file.",
+            "authorize_url": url_for("authorize", folder_id=target_folder_id)
+        }), 401
+
+    uploaded_files = selected_upload_files()
+    if not uploaded_files:
+        return jsonify({"status": "error", "message": "Tidak ada file yang dipilih."}), 400
+
+    creds = None
+    if folder_name == WORKFLOW.initial:
+        creds = get_user_credentials()
+        if not creds:
+            return jsonify({
+                "status": "error",
+                "message": "Otentikasi Google Anda tidak valid. Silakan coba lagi.",
+                "authorize_url": url_for("authorize", folder_id=target_folder_id)
+            }), 401
+
+    results = upload_files_to_drive(uploaded_files, target_folder_id, creds)
+    unexpected = [result.pop("unexpected", False) for result in results]
+    if any(unexpected):
+        session.pop('credentials', None) # Hapus kredensial yang mungkin rusak
+
+    succeeded = sum(result["status"] == "success" for result in results)
+    if succeeded == len(results):
+        status = "success"
+    elif succeeded:
+        status = "partial"
+    else:
+        status = "error"
+    return jsonify({"status": status, "results": results})
+
 @app.route("/delete_file/<file_id>", methods=["POST"])
 def delete_file(file_id):
     """Menghapus file dari Google Drive menggunakan akun layanan."""
@@ -426,16 +2403,26 @@ def delete_file(file_id):
         flash("Silakan login kembali untuk menghapus file.", "error")
         return redirect(url_for("view_folder", folder_id=current_folder_id))
         
-    if current_folder_name != "01 - Pengajuan Awal":
+    if current_folder_name != WORKFLOW.initial:
         flash("Akses Ditolak: Anda tidak memiliki izin untuk menghapus file di folder ini.", "error")
         return redirect(url_for("view_folder", folder_id=current_folder_id))
 
     try:
-        drive_service_sa.files().delete(fileId=file_id).execute()
+        drive_execute(drive_service_sa.files().delete(fileId=file_id))
+        DRIVE_INDEX.remove(file_id)
+        invalidate_folder_cache(current_folder_id)
         flash("File berhasil dihapus.", "success")
     except HttpError as e:
         logging.error(f"Error saat menghapus file: {e}")
         flash(f"Gagal menghapus file: {e}", "error")
+    except DriveUnavailableError as e:
+        flash(str(e), "error")
+    except Exception as e:
+        # Gangguan jaringan yang tetap gagal setelah percobaan ulang habis
+        if not is_transient_error(e):
+            raise
+        logging.error(f"Error saat menghapus file: {e}")
+        flash("Gagal menghapus file: Google Drive sedang bermasalah. Silakan coba lagi nanti.", "error")
 
     return redirect(url_for("view_folder", folder_id=current_folder_id))
 
@@ -453,49 +2440,148 @@ def load_file(file_id):
 @app.route("/start_download/<file_id>")
 def start_download(file_id):
     """Mulai proses unduhan file dari Google Drive di latar belakang."""
-    global DOWNLOAD_STATUS
-    DOWNLOAD_STATUS[file_id] = "downloading"
-    
-    download_thread = threading.Thread(target=download_file_thread, args=(file_id,))
-    download_thread.start()
-    
-    return jsonify({"status": "download_started"})
+    started = DOWNLOAD_JOBS.start(file_id)
+    return jsonify({"status": "download_started" if started else "download_in_progress"})
 
-def download_file_thread(file_id):
-    """Fungsi pembantu untuk mengunduh file dalam thread menggunakan akun layanan."""
-    global DOWNLOAD_STATUS
+def download_file_thread(file_id, jobs):
+    """Fungsi pembantu untuk mengunduh file dalam thread pool menggunakan akun layanan."""
     try:
-        file_metadata = drive_service_sa.files().get(fileId=file_id).execute()
-        filename = file_metadata.get("name")
-        temp_pdf_path = os.path.join(TEMP_DIR, filename)
-
-        request_file = drive_service_sa.files().get_media(fileId=file_id)
-        with io.FileIO(temp_pdf_path, "wb") as f:
-            downloader = MediaIoBaseDownload(f, request_file)
-            done = False
-            while not done:
-                _, done = downloader.next_chunk()
-        
-        DOWNLOAD_STATUS[file_id] = "ready"
+        file_metadata = get_file_by_id(file_id)
+        if not file_metadata:
+            raise ValueError("metadata file tidak tersedia")
+        version = get_file_version(file_metadata)
+
+        path = PDF_CACHE.get(file_id, version)
+        if not path:
+            path = download_to_cache(
+                file_id, version,
+                progress=lambda downloaded, total: jobs.update(file_id, "downloading", downloaded, total)
+            )
+
+        size = os.path.getsize(path)
+        jobs.update(file_id, "ready", size, size)
         logging.info(f"File {file_id} berhasil diunduh.")
     except Exception as e:
         logging.error(f"Error saat mengunduh file {file_id}: {e}")
-        DOWNLOAD_STATUS[file_id] = "error"
+        jobs.update(file_id, "error")
+
+def describe_download_status(file_id):
+    """Ringkasan status unduhan untuk dikirim ke browser."""
+    status = DOWNLOAD_JOBS.status(file_id) or {"state": "pending", "downloaded": 0, "total": None}
+    progress = None
+    if status.get("total"):
+        progress = round(100 * status["downloaded"] / status["total"])
+    return {
+        "ready": status["state"] == "ready",
+        "error": status["state"] == "error",
+        "downloaded": status["downloaded"],
+        "total": status["total"],
+        "progress": progress
+    }
 
 @app.route("/check_ready/<file_id>")
 def check_ready(file_id):
     """Memeriksa status unduhan file."""
-    global DOWNLOAD_STATUS
-    status = DOWNLOAD_STATUS.get(file_id, "pending")
-    return jsonify({"ready": status == "ready", "error": status == "error"})
+    return jsonify(describe_download_status(file_id))
+
+_download_event_streams = threading.BoundedSemaphore(DOWNLOAD_EVENTS_MAX_STREAMS)
+
+@app.route("/download_events/<file_id>")
+def download_events(file_id):
+    """Mengirim progres unduhan sebagai Server-Sent Events sampai file siap atau gagal.
+
+    Jika slot stream habis dijawab 503; EventSource lalu ditutup dan halaman
+    loading memakai polling /check_ready.
+    """
+    if not _download_event_streams.acquire(blocking=False):
+        return jsonify({"status": "error", "message": "Terlalu banyak koneksi progres, gunakan /check_ready."}), 503
+
+    def events():
+        # Browser menyambung ulang otomatis setelah 0,5 detik jika koneksi ditutup
+        yield "retry: 500\n\n"
+        deadline = time.monotonic() + DOWNLOAD_EVENTS_MAX_WAIT
+        last_sent = None
+        last_yield = time.monotonic()
+        while time.monotonic() < deadline:
+            status = describe_download_status(file_id)
+            if status != last_sent:
+                last_sent = status
+                last_yield = time.monotonic()
+                event = "ready" if status["ready"] else "failed" if status["error"] else "progress"
+                yield f"event: {event}\ndata: {json.dumps(status)}\n\n"
+                if event != "progress":
+                    return
+            elif time.monotonic() - last_yield > 15:
+                last_yield = time.monotonic()
+                yield ": keep-alive\n\n"
+            DOWNLOAD_JOBS.wait_for_change(timeout=0.5)
+
+    response = Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    # Slot dilepas saat respons ditutup, termasuk jika klien memutus koneksi lebih awal
+    response.call_on_close(_download_event_streams.release)
+    return response
+
+def stream_pdf_from_drive(file_metadata):
+    """Generator yang meneruskan isi file dari Drive per chunk sambil menyimpannya ke cache."""
+    from googleapiclient.http import MediaIoBaseDownload
+
+    file_id = file_metadata["id"]
+    request_file = drive_service_sa.files().get_media(fileId=file_id)
+    with PDF_CACHE.open_for_write(file_id, get_file_version(file_metadata)) as f:
+        buffer = io.BytesIO()
+        downloader = MediaIoBaseDownload(buffer, request_file, chunksize=DOWNLOAD_CHUNK_SIZE)
+        done = False
+        while not done:
+            _, done = drive_next_chunk(downloader)
+            chunk = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            f.write(chunk)
+            yield chunk
 
 @app.route("/download_pdf/<file_id>")
 def download_pdf(file_id):
-    """Mengirim file PDF yang sudah diunduh ke browser untuk pratinjau."""
+    """Mengirim file PDF yang sudah diunduh ke browser untuk pratinjau.
+
+    File dilayani langsung dari cache berdasarkan ID (tanpa panggilan Drive),
+    mendukung Range request dan GET bersyarat (ETag/Last-Modified, 304).
+    """
     try:
-        file_metadata = drive_service_sa.files().get(fileId=file_id).execute()
-        filename = file_metadata.get("name")
-        return send_from_directory(TEMP_DIR, filename, mimetype=mimetypes.guess_type(filename)[0])
+        cached = PDF_CACHE.latest(file_id)
+        if cached:
+            path, version, stored_at = cached
+            with open(path, "rb") as f:
+                is_pdf = f.read(5) == b"%PDF-"
+            response = send_file(
+                path,
+                mimetype="application/pdf" if is_pdf else "application/octet-stream",
+                conditional=True,
+                etag=PdfCache.key(file_id, version),
+                last_modified=stored_at,
+                max_age=0
+            )
+            response.headers["Accept-Ranges"] = "bytes"
+            return response
+
+        if not PDF_PROXY_STREAM:
+            raise FileNotFoundError(f"File {file_id} belum ada di cache")
+
+        # Belum ada di cache: teruskan langsung dari Drive agar byte pertama cepat sampai ke viewer
+        file_metadata = get_file_by_id(file_id)
+        if not file_metadata:
+            raise FileNotFoundError(f"File {file_id} tidak ditemukan")
+        headers = {"Cache-Control": "no-cache"}
+        if file_metadata.get("size"):
+            headers["Content-Length"] = file_metadata["size"]
+        return Response(
+            stream_with_context(stream_pdf_from_drive(file_metadata)),
+            mimetype=file_metadata.get("mimeType") or "application/pdf",
+            headers=headers
+        )
     except Exception as e:
         logging.error(f"Gagal mengirim file untuk pratinjau: {e}")
         flash("Gagal memuat file.", "error")
@@ -523,6 +2609,7 @@ def preview_file(file_id):
         "preview.html",
         file_id=file_id,
         folder=folder,
+        is_pengajuan_awal=folder == WORKFLOW.initial,
         folder_id=folder_id,
         default_year=default_year,
         default_month_num=default_month_num,
@@ -530,113 +2617,448 @@ def preview_file(file_id):
     )
 
 
-@app.route("/save_signature", methods=["POST"])
-def save_signature():
-    """Menerima tanda tangan, menambahkan ke PDF, mengunggah kembali, memindahkan, dan mengganti nama file."""
+class SigningError(Exception):
+    """Kesalahan penandatanganan yang pesannya boleh ditampilkan ke pengguna."""
 
-    try:
-        # Pindahkan semua pengambilan data dari request dan validasi di sini
-        data = request.json
-        logging.info(f"Data yang diterima: {data}")
-        if not data:
-            return jsonify({"status": "error", "message": "Permintaan tidak memiliki data JSON."}), 400
-
-        file_id = data.get("file_id")
-        current_folder_name = data.get("folder")
-        signature_data = data.get("signature")
-        pengajuan_bulan = data.get("pengajuan_bulan")
-        pengajuan_tahun = data.get("pengajuan_tahun")
-        perusahaan = data.get("perusahaan")
-        pengajuan_akhir = data.get("pengajuan_akhir")
-        
-        # Ambil metadata file di sini, sebelum melakukan validasi
-        file_metadata = get_file_by_id(file_id)
-        if not file_metadata:
-            return jsonify({"status": "error", "message": "File tidak ditemukan."}), 404
-        
-        # Lakukan validasi tipe file sekarang, setelah file_metadata tersedia
-        if file_metadata.get("mimeType") != "application/pdf":
-            return jsonify({"status": "error", "message": "File bukan PDF, tidak bisa ditandatangani."}), 400
-        
-        # Ambil file dari Google Drive
-        pdf_bytes = download_file_to_bytesio(file_id)
-        if not pdf_bytes:
-            return jsonify({"status": "error", "message": "File kosong atau gagal diunduh."}), 500
-
-        # Penandatanganan dilakukan dengan akun layanan
-        signed_bytes = None
-        if current_folder_name != "05 - Final":
-            signed_bytes = add_signature_to_pdf(pdf_bytes, signature_data)
-            
-            # Tambahkan cek untuk memastikan penandatanganan berhasil
-            if signed_bytes is None:
-                return jsonify({"status": "error", "message": "Gagal menambahkan tanda tangan ke dokumen."}), 500
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
 
+def resolve_signature(data):
+    """ID tanda tangan dari permintaan: signature_id yang sudah tersimpan, atau data URL yang disimpan dulu
+    (hanya untuk sesi yang sudah login).
+
+    Mengembalikan None jika permintaan tidak membawa tanda tangan.
+    """
+    signature_id = data.get("signature_id")
+    if signature_id:
+        if SIGNATURE_STORE.get(signature_id) is None:
+            raise SigningError("Tanda tangan tidak ditemukan, silakan tanda tangan ulang.", 404)
+        return signature_id
+    if not data.get("signature"):
+        return None
+    # Menyimpan gambar baru ke SIGNATURE_STORE butuh sesi login, sama seperti /signatures
+    if not session.get("logged_in"):
+        raise SigningError("Silakan login kembali untuk menandatangani dokumen.", 403)
+    try:
+        return store_signature_data_url(data["signature"])
+    except ValueError as e:
+        raise SigningError(str(e))
+
+def parse_signature_request(data, signature_id=None):
+    """Validasi awal permintaan tanda tangan yang tidak memerlukan akses ke Drive."""
+    if not data:
+        raise SigningError("Permintaan tidak memiliki data JSON.")
+    params = {
+        "file_id": data.get("file_id"),
+        "folder": data.get("folder"),
+        "signature_id": signature_id,
+        "pengajuan_bulan": data.get("pengajuan_bulan"),
+        "pengajuan_tahun": data.get("pengajuan_tahun"),
+        "perusahaan": data.get("perusahaan"),
+        "pengajuan_akhir": data.get("pengajuan_akhir"),
+    }
+    if not params["file_id"]:
+        raise SigningError("ID file tidak ada.")
+    if params["folder"] == WORKFLOW.initial:
+        if not (params["pengajuan_bulan"] and params["pengajuan_tahun"]):
+            raise SigningError("Lengkapi bulan dan tahun pengajuan.")
+        if not params["pengajuan_akhir"]:
+            raise SigningError("Pilih jenis pengajuan terlebih dahulu.")
+    if not params["signature_id"]:
+        params["signature_id"] = resolve_signature(data)
+    return params
+
+def sign_document(params, report=lambda stage: None):
+    """Menjalankan seluruh tahap penandatanganan satu dokumen: metadata, stamp, lalu commit ke Drive.
+
+    Aman dijalankan ulang: jika file sudah tidak berada di folder asal
+    (misalnya job yang sama pernah selesai), dokumen tidak ditandatangani dua kali.
+    """
+    file_id = params["file_id"]
+    current_folder_name = params["folder"]
+    signature_id = params["signature_id"]
+    perusahaan = params["perusahaan"]
+    pengajuan_akhir = params["pengajuan_akhir"]
+
+    # Metadata diambil langsung dari Drive karena versinya dipakai untuk memvalidasi salinan di cache
+    report("metadata")
+    file_metadata = get_file_by_id(file_id, fresh=True)
+    if not file_metadata:
+        raise SigningError("File tidak ditemukan.", 404)
+    if file_metadata.get("mimeType") != "application/pdf":
+        raise SigningError("File bukan PDF, tidak bisa ditandatangani.")
+
+    current_folder_id = WORKFLOW.folder_id(current_folder_name)
+    if current_folder_id and current_folder_id not in file_metadata.get("parents", []):
+        logging.info(f"File {file_id} sudah tidak berada di {current_folder_name}, dilewati.")
+        return {"skipped": True}
+
+    new_filename = file_metadata.get("name")
+    if current_folder_name == WORKFLOW.initial:
+        # Grup Rabat → wajib isi perusahaan
+        if "Rabat" in new_filename and not perusahaan:
+            raise SigningError("Perusahaan wajib diisi untuk grup Rabat.")
+
+        now = datetime.now()
+        month_str = now.strftime("%m")
+        year_str = now.strftime("%y")
+
+        kode_pengajuan = f"{pengajuan_akhir.upper()}{(perusahaan or '').upper()}"
+        original_filename = file_metadata.get("name")
+
+        new_filename = f"{year_str}/{month_str} {kode_pengajuan} - {original_filename}"
+
+    # Kode pengajuan: dari isian pengguna di tahap awal, lalu dari catatan status dokumen.
+    # Nama file hanya dipakai untuk dokumen lama yang belum punya catatan.
+    if current_folder_name == WORKFLOW.initial:
+        type_code = pengajuan_akhir.upper()
+    else:
+        state = DOCUMENT_STATES.get(file_id)
+        type_code = state["type_code"] if state else WORKFLOW.code_from_filename(new_filename)
+
+    target_folder_name, target_id = WORKFLOW.next_stage(current_folder_name, type_code)
+
+    # Penandatanganan dilakukan dengan akun layanan
+    signed_bytes = None
+    if current_folder_name != WORKFLOW.final:
+        report("stamp")
+        if not signature_id:
+            raise SigningError("Silakan tanda tangan terlebih dahulu.")
+        signature_data = SIGNATURE_STORE.get(signature_id)
+        if signature_data is None:
+            raise SigningError("Tanda tangan tidak ditemukan, silakan tanda tangan ulang.", 404)
+        # Pakai salinan hasil pratinjau di cache selama versinya masih sama dengan di Drive
+        pdf_file = open_pdf(file_metadata)
+        if not pdf_file:
+            raise SigningError("File kosong atau gagal diunduh.", 500)
+        with pdf_file:
+            try:
+                signed_bytes = add_signature_to_pdf(pdf_file, signature_data)
+            except StampLimitError as e:
+                raise SigningError(str(e), 500)
+        if signed_bytes is None:
+            raise SigningError("Gagal menambahkan tanda tangan ke dokumen.", 500)
+
+    # Isi baru, nama baru, dan pindah folder dikirim dalam satu files.update, sehingga
+    # file tidak pernah tertinggal dalam keadaan setengah jadi (mis. sudah diganti nama tapi belum pindah)
+    parents = file_metadata.get("parents", [])
+    update_args = {}
+    if new_filename != file_metadata.get("name"):
+        update_args["body"] = {"name": new_filename}
+    if target_id:
+        update_args["addParents"] = target_id
+        update_args["removeParents"] = ",".join(parents)
+
+    if signed_bytes is not None or update_args:
+        report("commit")
+        from googleapiclient.http import MediaIoBaseUpload
+
+        media = None
+        if signed_bytes is not None:
+            signed_bytes.seek(0)
             media = MediaIoBaseUpload(signed_bytes, mimetype="application/pdf", resumable=True)
-            drive_service_sa.files().update(fileId=file_id, media_body=media).execute()
-        
-        new_filename = file_metadata.get("name")
-        kode_pengajuan = None
-
-        # Validasi input tambahan
-        if current_folder_name == "01 - Pengajuan Awal":
-            if not (pengajuan_bulan and pengajuan_tahun):
-                return jsonify({"status": "error", "message": "Lengkapi bulan dan tahun pengajuan."}), 400
-
-            # Grup Rabat → wajib isi perusahaan
-            # Perlu diperbaiki, target_folder_id belum didefinisikan di sini
-            if current_folder_name.startswith("01"):
-                # Contoh perbaikan: Asumsikan target_folder_id akan ditentukan nanti
-                # dan kita hanya mengecek jika perusahaan harus diisi
-                pass
-
-            if "Rabat" in new_filename and not perusahaan:
-                 return jsonify({"status": "error", "message": "Perusahaan wajib diisi untuk grup Rabat."}), 400
-
-            now = datetime.now()
-            month_str = now.strftime("%m")
-            year_str = now.strftime("%y")
-            
-            kode_pengajuan = f"{pengajuan_akhir.upper()}{perusahaan.upper()}"
-            original_filename = file_metadata.get("name")
-            
-            new_filename = f"{year_str}/{month_str} {kode_pengajuan} - {original_filename}"
-            drive_service_sa.files().update(fileId=file_id, body={'name': new_filename}).execute()
-        
-        folder_mapping = {
-            "01 - Pengajuan Awal": {
-                "SR": "02A - SPV HRGA", "MR": "02B - PAMO", "GR": "02B - PAMO",
-                "SP": "02A - SPV HRGA", "MP": "02A - SPV HRGA", "GP": "02A - SPV HRGA",
-            },
-            "02A - SPV HRGA": {"SR": "03A - SPV", "MR": "03B - Manager", "GR": "03C - General"},
-            "02B - PAMO": {"SP": "04A - SPV", "MP": "04B - Manager", "GP": "04C - General"},
-            "03A - SPV": {"SR": "05 - Final"},
-            "03B - Manager": {"MR": "05 - Final"},
-            "03C - General": {"GR": "05 - Final"},
-            "04A - SPV": {"SP": "05 - Final"},
-            "04B - Manager": {"MP": "05 - Final"},
-            "04C - General": {"GP": "05 - Final"},
-        }
-        
-        if current_folder_name == "01 - Pengajuan Awal":
-            kode_pengajuan_to_map = pengajuan_akhir.upper()
+        # Upload resumable yang gagal di tengah dilanjutkan dari sesi yang sama oleh drive_execute
+        updated = drive_execute(drive_service_sa.files().update(
+            fileId=file_id, media_body=media, fields=DriveIndex.FIELDS, **update_args
+        ))
+        DRIVE_INDEX.upsert(updated)
+        if signed_bytes is not None:
+            # Simpan hasil tanda tangan sebagai versi baru agar tahap berikutnya tidak mengunduh ulang
+            PDF_CACHE.put_bytes(file_id, get_file_version(updated), signed_bytes.getvalue())
+        if target_id:
+            DOCUMENT_STATES.record(file_id, type_code, current_folder_name, target_folder_name)
+            logging.info(f"File {file_id} berhasil dipindahkan ke folder {target_id}.")
+
+    # Nama, isi, dan lokasi file berubah, jadi daftar folder terkait perlu dimuat ulang
+    invalidate_folder_cache(*parents, *([target_id] if target_id else []))
+
+    return {"skipped": False, "target_folder": target_folder_name}
+
+class SigningJobQueue:
+    """Antrean job penandatanganan yang dijalankan di thread pool terbatas.
+
+    ID job diturunkan dari idempotency key, sehingga permintaan ganda
+    (mis. tombol simpan diklik dua kali) mengarah ke job yang sama. Kunci dari
+    klien digabung dengan file dan folder, jadi kunci yang sama untuk dokumen
+    lain tetap menjadi job baru.
+    """
+
+    # Job "queued"/"running" tanpa pembaruan selama ini dianggap hilang (mis. worker restart)
+    STALE_AFTER = 600
+
+    def __init__(self, store, max_workers, ttl):
+        self.store = store
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sign")
+        self._lock = threading.Lock()
+        self._last_purge = 0
+
+    @staticmethod
+    def idempotency_key(params):
+        """Kunci bawaan: isi permintaan (tanda tangan sudah diwakili ID-nya, yaitu hash gambar)."""
+        return json.dumps(params, sort_keys=True)
+
+    def submit(self, params, idempotency_key=None):
+        """Memasukkan job ke antrean; mengembalikan (job_id, dibuat_baru)."""
+        self._maybe_purge()
+        if idempotency_key:
+            key = json.dumps([idempotency_key, params["file_id"], params["folder"]])
         else:
-            filename_parts = new_filename.split()
-            # Perbaikan: Tambahkan pemeriksaan indeks untuk menghindari IndexError
-            kode_pengajuan_to_map = filename_parts[1].split('-')[0][:2].upper() if len(filename_parts) > 1 and '-' in filename_parts[1] else None
+            key = self.idempotency_key(params)
+        job_id = hashlib.sha256(key.encode()).hexdigest()[:32]
+        with self._lock:
+            status = self.status(job_id)
+            if status and status["state"] != "failed":
+                return job_id, False
+            self.store.set(job_id, {"state": "queued", "stage": None, "file_id": params["file_id"], "message": None})
+            self._executor.submit(self._run, job_id, params)
+        return job_id, True
+
+    def _run(self, job_id, params):
+        file_id = params["file_id"]
+
+        def report(stage):
+            self.store.set(job_id, {"state": "running", "stage": stage, "file_id": file_id, "message": None})
+
+        try:
+            result = sign_document(params, report)
+            if result.get("skipped"):
+                # Dokumen sudah pindah dari folder asal, jadi tidak ditandatangani oleh job ini
+                self.store.set(job_id, dict(result, state="skipped", stage=None, file_id=file_id,
+                                            message="Dokumen sudah tidak berada di folder ini, tidak ditandatangani."))
+            else:
+                self.store.set(job_id, dict(result, state="done", stage=None, file_id=file_id, message="OK"))
+        except SigningError as e:
+            self.store.set(job_id, {"state": "failed", "stage": None, "file_id": file_id,
+                                    "message": e.message, "status_code": e.status_code})
+        except DriveUnavailableError as e:
+            self.store.set(job_id, {"state": "failed", "stage": None, "file_id": file_id,
+                                    "message": str(e), "status_code": 503})
+        except Exception as e:
+            logging.exception("Error dalam job penandatanganan. Full traceback:")
+            self.store.set(job_id, {"state": "failed", "stage": None, "file_id": file_id,
+                                    "message": f"Terjadi kesalahan server: {e}", "status_code": 500})
 
-        target_folder_name = folder_mapping.get(current_folder_name, {}).get(kode_pengajuan_to_map)
+    def status(self, job_id):
+        status = self.store.get(job_id)
+        if not status:
+            return None
+        age = time.time() - status["updated_at"]
+        if status["state"] in FINISHED_JOB_STATES and age > self.ttl:
+            return None
+        if status["state"] not in FINISHED_JOB_STATES and age > self.STALE_AFTER:
+            return dict(status, state="failed", message="Job terhenti sebelum selesai, silakan coba lagi.")
+        return status
+
+    def _maybe_purge(self):
+        now = time.time()
+        if now - self._last_purge > 60:
+            self._last_purge = now
+            self.store.purge(now - self.ttl)
+
+SIGNING_JOBS = SigningJobQueue(
+    create_status_store(SIGN_STATUS_BACKEND, "sign_jobs"),
+    max_workers=SIGN_WORKERS,
+    ttl=SIGN_STATUS_TTL
+)
+
+@app.route("/signatures", methods=["POST"])
+def upload_signature():
+    """Menyimpan gambar tanda tangan (data URL PNG) dan mengembalikan ID-nya.
+
+    ID dapat dikirim sebagai signature_id ke /save_signature dan /bulk_sign
+    sebagai pengganti data URL, sehingga gambar tidak perlu diunggah ulang.
+    """
+    if not session.get("logged_in"):
+        return jsonify({"status": "error", "message": "Silakan login kembali untuk menandatangani dokumen."}), 403
+    data = request.get_json(silent=True) or {}
+    try:
+        signature_id = store_signature_data_url(data.get("signature"))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify({"status": "success", "signature_id": signature_id}), 201
 
-        if target_folder_name:
-            target_id = FOLDERS.get(target_folder_name)
-            if target_id:
-                move_file(file_id, target_id)
+@app.route("/save_signature", methods=["POST"])
+def save_signature():
+    """Memvalidasi permintaan tanda tangan lalu memasukkannya ke antrean penandatanganan.
 
-        return jsonify({"status": "success", "message": "OK"}), 200
+    Penandatanganan, unggah ulang, ganti nama, dan pemindahan file dijalankan
+    oleh SIGNING_JOBS; status dapat dipantau lewat /signature_jobs/<job_id>.
+    """
 
+    try:
+        # Pindahkan semua pengambilan data dari request dan validasi di sini
+        data = request.json
+        # Gambar tanda tangan (base64), jika dikirim langsung, tidak ikut dicatat ke log
+        if isinstance(data, dict):
+            logging.info(f"Data yang diterima: {({k: v for k, v in data.items() if k != 'signature'})}")
+        params = parse_signature_request(data)
+        job_id, _ = SIGNING_JOBS.submit(params, request.headers.get("Idempotency-Key"))
+        return jsonify({
+            "status": "queued",
+            "job_id": job_id,
+            "status_url": url_for("signature_job_status", job_id=job_id)
+        }), 202
+
+    except SigningError as e:
+        return jsonify({"status": "error", "message": e.message}), e.status_code
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
         logging.exception("Error dalam save_signature. Full traceback:")
         return jsonify({"status": "error", "message": f"Terjadi kesalahan server: {e}"}), 500
 
+@app.route("/signature_jobs/<job_id>")
+def signature_job_status(job_id):
+    """Status job penandatanganan: queued, running (dengan tahapnya), done, atau failed."""
+    status = SIGNING_JOBS.status(job_id)
+    if not status:
+        return jsonify({"status": "error", "message": "Job tidak ditemukan."}), 404
+    return jsonify(dict(status, job_id=job_id))
+
+@app.route("/bulk_sign", methods=["POST"])
+def bulk_sign():
+    """Menandatangani banyak dokumen di satu folder dengan satu tanda tangan.
+
+    Setiap dokumen menjadi job di SIGNING_JOBS (paralelisme dibatasi SIGN_WORKERS),
+    dan hasil per file dipantau lewat /bulk_sign/status.
+    """
+    data = request.json or {}
+    folder_id = data.get("folder_id")
+    folder_name = get_folder_name_by_id(folder_id)
+    file_ids = data.get("file_ids") or []
+
+    if not session.get("logged_in") or session.get("folder_id") != folder_id:
+        return jsonify({"status": "error", "message": "Silakan login kembali untuk menandatangani dokumen."}), 403
+    if not folder_name or folder_name in (WORKFLOW.initial, WORKFLOW.final):
+        return jsonify({"status": "error", "message": "Tanda tangan massal tidak tersedia untuk folder ini."}), 400
+    if not isinstance(file_ids, list) or not file_ids:
+        return jsonify({"status": "error", "message": "Pilih minimal satu dokumen."}), 400
+    if not all(isinstance(file_id, str) and file_id for file_id in file_ids):
+        return jsonify({"status": "error", "message": "Daftar dokumen tidak valid."}), 400
+    if len(file_ids) > BULK_SIGN_MAX_FILES:
+        return jsonify({"status": "error", "message": f"Maksimal {BULK_SIGN_MAX_FILES} dokumen per permintaan."}), 400
+    try:
+        # Tanda tangan disimpan sekali lalu semua job memakai ID yang sama
+        signature_id = resolve_signature(data)
+    except SigningError as e:
+        return jsonify({"status": "error", "message": e.message}), e.status_code
+    if not signature_id:
+        return jsonify({"status": "error", "message": "Silakan tanda tangan terlebih dahulu."}), 400
+
+    results = []
+    for file_id in dict.fromkeys(file_ids):
+        try:
+            params = parse_signature_request({"file_id": file_id, "folder": folder_name}, signature_id)
+            job_id, _ = SIGNING_JOBS.submit(params)
+            results.append({"file_id": file_id, "job_id": job_id, "state": "queued"})
+        except SigningError as e:
+            results.append({"file_id": file_id, "job_id": None, "state": "failed", "message": e.message})
+
+    return jsonify({
+        "status": "queued",
+        "results": results,
+        "status_url": url_for("bulk_sign_status", job_id=[r["job_id"] for r in results if r["job_id"]])
+    }), 202
+
+@app.route("/bulk_sign/status")
+def bulk_sign_status():
+    """Status per file untuk sekumpulan job tanda tangan massal."""
+    results = []
+    summary = {"queued": 0, "running": 0, "done": 0, "skipped": 0, "failed": 0}
+    for job_id in request.args.getlist("job_id"):
+        status = SIGNING_JOBS.status(job_id) or {"state": "failed", "message": "Job tidak ditemukan."}
+        results.append({
+            "job_id": job_id,
+            "file_id": status.get("file_id"),
+            "state": status["state"],
+            "stage": status.get("stage"),
+            "message": status.get("message"),
+        })
+        summary[status["state"]] = summary.get(status["state"], 0) + 1
+    finished = summary["queued"] == 0 and summary["running"] == 0
+    return jsonify({"finished": finished, "summary": summary, "results": results})
+
+# Modul yang dimuat warmup() agar request pertama tidak menanggung biaya impornya
+WARMUP_MODULES = (
+    "PyPDF2",
+    "PyPDF2.generic",
+    "reportlab.pdfgen.canvas",
+    "reportlab.lib.utils",
+    "PIL.Image",
+    "googleapiclient.discovery",
+    "googleapiclient.http",
+    "google_auth_httplib2",
+    "google.oauth2.service_account",
+    "google.oauth2.credentials",
+    "google.auth.transport.requests",
+    "google_auth_oauthlib.flow",
+)
+
+def warmup():
+    """Memuat library berat, dokumen discovery Drive, dan token akun layanan lebih awal."""
+    start = time.time()
+    for name in WARMUP_MODULES:
+        importlib.import_module(name)
+    DRIVE_CLIENTS.document()
+    try:
+        from google.auth.transport.requests import Request as AuthRequest
+
+        get_service_account_credentials().refresh(AuthRequest())
+    except Exception as e:
+        logging.error(f"Warm-up kredensial akun layanan gagal: {e}")
+    logging.info(f"Warm-up selesai dalam {time.time() - start:.2f} detik")
+
+def queue_depths():
+    """Jumlah tugas yang menunggu di setiap thread pool (belum diambil worker)."""
+    executors = {
+        "download": DOWNLOAD_JOBS._executor,
+        "sign": SIGNING_JOBS._executor,
+        "upload": UPLOAD_EXECUTOR,
+        "drive_io": DRIVE_IO_EXECUTOR,
+    }
+    return [({"queue": name}, executor._work_queue.qsize()) for name, executor in executors.items()]
+
+METRICS.gauge("queue_depth", "Tugas yang menunggu di antrean unduhan, tanda tangan, unggahan, dan I/O Drive.", queue_depths)
+METRICS.gauge("drive_circuit_open", "1 jika circuit breaker Drive sedang menolak panggilan.",
+              lambda: [({}, int(DRIVE_CALLS.breaker.state == "open"))])
+METRICS.gauge("drive_index_files", "Jumlah file di indeks Drive lokal (0 jika belum tersinkron).",
+              lambda: [({}, len(DRIVE_INDEX) if DRIVE_INDEX.ready else 0)])
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.teardown_request
+def release_drive_service(exception=None):
+    """Layanan Drive milik request ini dipakai ulang oleh request berikutnya."""
+    drive_service_sa.release()
+
+@app.after_request
+def record_request_metrics(response):
+    """Mencatat durasi request per rute dan, jika diaktifkan, menambahkan header Server-Timing."""
+    started = g.get("request_started")
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    METRICS.observe("http_request_duration_seconds", elapsed,
+                    route=route, method=request.method, status=response.status_code)
+    if METRICS_SERVER_TIMING:
+        timings = [f"app;dur={elapsed * 1000:.1f}"]
+        if g.get("drive_calls"):
+            timings.append(f'drive;dur={g.drive_seconds * 1000:.1f};desc="{g.drive_calls} panggilan Drive"')
+        response.headers["Server-Timing"] = ", ".join(timings)
+    return response
+
+@app.route("/metrics")
+def metrics():
+    """Metrik aplikasi dalam format teks Prometheus."""
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        return Response("Unauthorized\n", status=401, mimetype="text/plain")
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     app.run(debug=True, port=int(os.environ.get("PORT", 5000)))
@@ -0,0 +1,93 @@
+"""Utilitas bersama untuk skrip benchmark.
+
+Benchmark dijalankan tanpa kredensial Google: konfigurasi diisi nilai dummy
+dan direktori kerja dipindah ke direktori sementara agar cache PDF milik
+aplikasi tidak tersentuh.
+"""
+import base64
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DUMMY_FOLDERS = {
+    "01 - Pengajuan Awal": "folder-01",
+    "02A - SPV HRGA": "folder-02a",
+    "02B - PAMO": "folder-02b",
+    "03A - SPV": "folder-03a",
+    "03B - Manager": "folder-03b",
+    "03C - General": "folder-03c",
+    "04A - SPV": "folder-04a",
+    "04B - Manager": "folder-04b",
+    "04C - General": "folder-04c",
+    "05 - Final": "folder-05",
+}
+
+
+def dummy_env():
+    """Variabel lingkungan minimum agar app.py bisa diimpor tanpa akses Google."""
+    return {
+        "SECRET_KEY": "benchmark",
+        "GOOGLE_SERVICE_ACCOUNT": "{}",
+        "FOLDERS": json.dumps(DUMMY_FOLDERS),
+        "FOLDER_PASSWORDS": "{}",
+    }
+
+
+def load_app():
+    """Mengimpor app.py dari root repositori dengan konfigurasi dummy."""
+    for key, value in dummy_env().items():
+        os.environ.setdefault(key, value)
+    os.chdir(tempfile.mkdtemp(prefix="esign-bench-"))
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    import app
+    return app
+
+
+def make_pdf(pages):
+    """Membuat PDF contoh dengan sejumlah halaman berisi teks."""
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer)
+    for number in range(pages):
+        for line in range(40):
+            c.drawString(72, 780 - line * 18, f"Halaman {number + 1} baris {line + 1} - dokumen pengajuan")
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+def make_signature_png(width=400, height=150):
+    """Membuat PNG transparan berisi coretan sederhana, mirip keluaran signature_pad."""
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    points = [(20 + i * 12, height // 2 + (25 if i % 2 else -25)) for i in range((width - 40) // 12)]
+    draw.line(points, fill=(0, 0, 0, 255), width=3)
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def signature_data_url(png_bytes=None):
+    png_bytes = png_bytes or make_signature_png()
+    return "data:image/png;base64," + base64.b64encode(png_bytes).decode()
+
+
+def percentiles(samples):
+    """Mengembalikan p50/p95/p99 (detik) dari daftar durasi."""
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    return {"p50": statistics.median(ordered), "p95": pick(0.95), "p99": pick(0.99)}
@@ -0,0 +1,195 @@
+"""Uji beban rute utama terhadap Drive palsu (bench/fake_drive.py).
+
+Setiap skenario dijalankan dengan beberapa tingkat konkurensi; setiap thread
+memakai test_client sendiri. Dilaporkan throughput (op/detik) dan latensi
+p50/p95/p99 per skenario:
+  - index: GET / (daftar semua folder)
+  - view_folder: GET /folder/<id>
+  - preview: start_download -> check_ready (polling) -> download_pdf
+  - sign: save_signature -> polling /signature_jobs/<id> sampai selesai
+  - stamp: add_signature_to_pdf langsung, untuk beberapa ukuran PDF
+
+    python bench/bench_load.py
+    python bench/bench_load.py --concurrency 1 4 16 --requests 200 --latency 0.05
+    python bench/bench_load.py --scenarios index preview --files 500
+"""
+import argparse
+import io
+import os
+import threading
+import time
+
+from _common import load_app, make_pdf, percentiles, signature_data_url
+
+# Pembatas laju Drive dimatikan agar yang terukur adalah aplikasi, bukan token bucket
+os.environ.setdefault("DRIVE_RATE_LIMIT", "0")
+app = load_app()
+
+from fake_drive import FakeDrive, install
+
+SOURCE_FOLDER = "folder-02a"
+SOURCE_FOLDER_NAME = "02A - SPV HRGA"
+POLL_INTERVAL = 0.01
+POLL_TIMEOUT = 60
+
+
+def logged_in_client(folder_id):
+    client = app.app.test_client()
+    with client.session_transaction() as session:
+        session["logged_in"] = True
+        session["folder_id"] = folder_id
+    return client
+
+
+def wait_until(check):
+    deadline = time.perf_counter() + POLL_TIMEOUT
+    while time.perf_counter() < deadline:
+        if check():
+            return
+        time.sleep(POLL_INTERVAL)
+    raise TimeoutError("Operasi tidak selesai dalam batas waktu.")
+
+
+def run_index(client, file_id):
+    response = client.get("/")
+    assert response.status_code == 200, response.status_code
+
+
+def run_view_folder(client, file_id):
+    response = client.get(f"/folder/{SOURCE_FOLDER}")
+    assert response.status_code == 200, response.status_code
+
+
+def run_preview(client, file_id):
+    client.get(f"/start_download/{file_id}")
+    wait_until(lambda: client.get(f"/check_ready/{file_id}").get_json().get("ready"))
+    response = client.get(f"/download_pdf/{file_id}")
+    assert response.status_code == 200, response.status_code
+
+
+def run_sign(client, file_id):
+    response = client.post("/save_signature", json={
+        "file_id": file_id,
+        "folder": SOURCE_FOLDER_NAME,
+        "signature": SIGNATURE,
+    })
+    assert response.status_code in (200, 202), response.get_json()
+    status_url = response.get_json()["status_url"]
+    result = {}
+
+    def finished():
+        result.update(client.get(status_url).get_json())
+        return result.get("state") in ("done", "skipped", "failed")
+
+    wait_until(finished)
+    assert result["state"] == "done", result
+
+
+SCENARIOS = {
+    "index": run_index,
+    "view_folder": run_view_folder,
+    "preview": run_preview,
+    "sign": run_sign,
+}
+
+
+def run_load(name, func, concurrency, file_ids):
+    """Menjalankan satu operasi per item file_ids, dibagi ke `concurrency` thread."""
+    samples = []
+    errors = []
+    lock = threading.Lock()
+    pending = iter(file_ids)
+
+    def worker():
+        client = logged_in_client(SOURCE_FOLDER)
+        while True:
+            with lock:
+                file_id = next(pending, None)
+            if file_id is None:
+                return
+            begin = time.perf_counter()
+            try:
+                func(client, file_id)
+            except Exception as e:
+                with lock:
+                    errors.append(repr(e))
+                continue
+            elapsed = time.perf_counter() - begin
+            with lock:
+                samples.append(elapsed)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    report(name, concurrency, samples, wall, errors)
+
+
+def report(name, concurrency, samples, wall, errors):
+    stats = percentiles(samples)
+    throughput = len(samples) / wall if wall else 0.0
+    print(f"  {name:<14} c={concurrency:<3} n={len(samples):<5} {throughput:8.1f} op/s"
+          f"  p50 {stats['p50'] * 1000:8.1f}  p95 {stats['p95'] * 1000:8.1f}  p99 {stats['p99'] * 1000:8.1f} ms"
+          + (f"  galat={len(errors)}" if errors else ""))
+    if errors:
+        print(f"    contoh galat: {errors[0]}")
+
+
+def bench_stamp(concurrency, total, pages_list):
+    for pages in pages_list:
+        pdf_bytes = make_pdf(pages)
+        app.add_signature_to_pdf(io.BytesIO(pdf_bytes), SIGNATURE)
+
+        def stamp(client, file_id):
+            app.add_signature_to_pdf(io.BytesIO(pdf_bytes), SIGNATURE)
+
+        for level in concurrency:
+            run_load(f"stamp {pages}hal", stamp, level, range(total))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS) + ["stamp"],
+                        choices=list(SCENARIOS) + ["stamp"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=100, help="jumlah operasi per skenario per tingkat konkurensi")
+    parser.add_argument("--latency", type=float, default=0.02, help="latensi Drive palsu per panggilan (detik)")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--files", type=int, default=200, help="jumlah file per folder")
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 50], help="ukuran PDF skenario stamp")
+    args = parser.parse_args()
+
+    backend = FakeDrive(latency=args.latency, jitter=args.jitter, seed=1)
+    sample_pdf = make_pdf(2)
+    for folder_id in set(app.FOLDERS.values()) - {SOURCE_FOLDER}:
+        for number in range(args.files):
+            backend.add_file(folder_id, f"dokumen {number}.pdf", sample_pdf)
+    preview_ids = [backend.add_file(SOURCE_FOLDER, f"01 SR-x preview {number}.pdf", sample_pdf)["id"]
+                   for number in range(args.files)]
+    install(app, backend)
+
+    print(f"Drive palsu: latensi {args.latency * 1000:.0f} ms, {args.files} file/folder, "
+          f"{args.requests} operasi per tingkat konkurensi")
+    for name in args.scenarios:
+        if name == "stamp":
+            bench_stamp(args.concurrency, args.requests, args.pages)
+            continue
+        for level in args.concurrency:
+            if name == "sign":
+                # Dokumen yang ditandatangani pindah folder, jadi setiap operasi butuh file baru
+                file_ids = [backend.add_file(SOURCE_FOLDER, f"01 SR-x sign {level}-{number}.pdf", sample_pdf)["id"]
+                            for number in range(args.requests)]
+            else:
+                file_ids = [preview_ids[number % len(preview_ids)] for number in range(args.requests)]
+            run_load(name, SCENARIOS[name], level, file_ids)
+
+    print(f"Panggilan Drive: {dict(sorted(backend.request_counts.items()))}")
+
+
+SIGNATURE = signature_data_url()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Uji beban mode serving gunicorn (gthread vs gevent) terhadap Drive palsu.
+
+Untuk setiap mode, satu instance gunicorn (bench/fake_wsgi.py, konfigurasi
+gunicorn.conf.py) dijalankan lalu dibebani sejumlah pengguna bersamaan. Setiap
+pengguna memakai koneksi keep-alive sendiri dan bergantian membuka halaman
+utama (batch listing semua folder) dan /load_file/<id> (files.get). Cache
+daftar folder dimatikan agar setiap request menunggu Drive.
+
+Dilaporkan throughput, latensi p50/p95/p99, jumlah galat, dan jumlah pengguna
+bersamaan terbanyak yang masih dilayani dengan p95 di bawah --slo.
+
+    python bench/bench_serving.py
+    python bench/bench_serving.py --users 8 32 128 512 --latency 0.2 --duration 15
+    python bench/bench_serving.py --modes gevent --workers 2
+"""
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from _common import percentiles, REPO_ROOT
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(mode, port, args):
+    env = dict(
+        os.environ,
+        GUNICORN_WORKER_CLASS=mode,
+        WEB_CONCURRENCY=str(args.workers),
+        GUNICORN_THREADS=str(args.threads),
+        FAKE_DRIVE_LATENCY=str(args.latency),
+        FAKE_DRIVE_FILES=str(args.files),
+        FOLDER_CACHE_TTL="0",
+        DRIVE_RATE_LIMIT="0",
+        WARMUP_ON_START="false",
+    )
+    command = [
+        sys.executable, "-m", "gunicorn",
+        "-c", os.path.join(REPO_ROOT, "gunicorn.conf.py"),
+        "--chdir", BENCH_DIR,
+        "--bind", f"127.0.0.1:{port}",
+        "--log-level", "warning",
+        "fake_wsgi:application",
+    ]
+    server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            connection.request("GET", "/metrics")
+            connection.getresponse().read()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f"gunicorn ({mode}) tidak siap dalam 60 detik")
+
+
+def run_users(port, users, duration, paths):
+    """Menjalankan `users` pengguna bersamaan selama `duration` detik."""
+    samples = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def user(offset):
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        number = offset
+        while time.perf_counter() < stop_at:
+            path = paths[number % len(paths)]
+            number += 1
+            begin = time.perf_counter()
+            try:
+                connection.request("GET", path)
+                response = connection.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+                ok = False
+            elapsed = time.perf_counter() - begin
+            with lock:
+                if ok:
+                    samples.append(elapsed)
+                else:
+                    errors[0] += 1
+        connection.close()
+
+    threads = [threading.Thread(target=user, args=(n,)) for n in range(users)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, errors[0], time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=["gthread", "gevent"], choices=["gthread", "gevent"])
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--duration", type=float, default=10, help="lama pembebanan per tingkat (detik)")
+    parser.add_argument("--latency", type=float, default=0.1, help="latensi Drive palsu per panggilan (detik)")
+    parser.add_argument("--files", type=int, default=20, help="jumlah file per folder")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=8, help="thread per worker (mode gthread)")
+    parser.add_argument("--slo", type=float, default=1.0, help="batas p95 (detik)")
+    args = parser.parse_args()
+
+    # ID file Drive palsu berurutan dari fake-1, sama di setiap worker
+    paths = ["/"] + [f"/load_file/fake-{number}" for number in range(1, 6)]
+    print(f"Drive palsu: latensi {args.latency * 1000:.0f} ms; {args.workers} worker; "
+          f"{args.duration:g} detik per tingkat; SLO p95 <= {args.slo * 1000:.0f} ms")
+    for mode in args.modes:
+        port = free_port()
+        server = start_server(mode, port, args)
+        best = 0
+        try:
+            print(f"{mode}" + (f" ({args.threads} thread/worker)" if mode == "gthread" else ""))
+            for users in args.users:
+                samples, errors, wall = run_users(port, users, args.duration, paths)
+                stats = percentiles(samples)
+                print(f"  pengguna={users:<5} {len(samples) / wall:8.1f} req/s"
+                      f"  p50 {stats['p50'] * 1000:8.1f}  p95 {stats['p95'] * 1000:8.1f}"
+                      f"  p99 {stats['p99'] * 1000:8.1f} ms  galat={errors}")
+                if samples and not errors and stats["p95"] <= args.slo:
+                    best = users
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"  pengguna bersamaan terbanyak dalam SLO: {best}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Benchmark penempelan tanda tangan: implementasi lama vs SignatureStamper.
+
+Mengukur waktu (wall time) dan memori puncak (tracemalloc) untuk PDF
+1, 50, dan 500 halaman, serta ukuran file setelah empat tahap persetujuan
+(01 -> 02x -> 03x/04x -> 05) untuk mode incremental dan rewrite.
+
+    python bench/bench_stamp.py
+    python bench/bench_stamp.py --pages 1 50 500 --repeat 5
+"""
+import argparse
+import base64
+import io
+import time
+import tracemalloc
+
+from _common import load_app, make_pdf, signature_data_url
+
+app = load_app()
+
+from PyPDF2 import PdfReader, PdfWriter
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas as pdf_canvas
+
+
+def legacy_add_signature_to_pdf(input_pdf_bytesio, signature_data_url):
+    """Implementasi add_signature_to_pdf sebelum SignatureStamper, sebagai pembanding."""
+    header, encoded_data = signature_data_url.split(",", 1)
+    signature_binary_data = base64.b64decode(encoded_data)
+
+    sig_pdf_bytesio = io.BytesIO()
+    c = pdf_canvas.Canvas(sig_pdf_bytesio, pagesize=A4)
+    image = ImageReader(io.BytesIO(signature_binary_data))
+    c.drawImage(image, x=220, y=100, width=150, height=50, mask='auto')
+    c.save()
+    sig_pdf_bytesio.seek(0)
+
+    input_pdf = PdfReader(input_pdf_bytesio)
+    sig_pdf = PdfReader(sig_pdf_bytesio)
+
+    output = PdfWriter()
+    for i in range(len(input_pdf.pages)):
+        page = input_pdf.pages[i]
+        if i == len(input_pdf.pages) - 1:
+            page.merge_page(sig_pdf.pages[0])
+        output.add_page(page)
+
+    signed_bytesio = io.BytesIO()
+    output.write(signed_bytesio)
+    signed_bytesio.seek(0)
+    return signed_bytesio
+
+
+def measure(func, pdf_bytes, data_url, repeat):
+    durations = []
+    peak = 0
+    size = 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = func(io.BytesIO(pdf_bytes), data_url)
+        durations.append(time.perf_counter() - start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        size = len(result.getvalue())
+    return min(durations), peak, size
+
+
+def stage_growth(func, pdf_bytes, data_url, stages=4):
+    """Ukuran dokumen setelah ditandatangani berulang kali seperti alur persetujuan."""
+    current = pdf_bytes
+    for _ in range(stages):
+        current = func(io.BytesIO(current), data_url).getvalue()
+    return len(current)
+
+
+def stamper_func(mode):
+    stamper = app.SignatureStamper(mode=mode)
+    return lambda pdf, data_url: stamper.stamp(pdf, base64.b64decode(data_url.split(",", 1)[1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 50, 500])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    data_url = signature_data_url()
+    implementations = [
+        ("lama", legacy_add_signature_to_pdf),
+        ("rewrite", stamper_func("rewrite")),
+        ("incremental", stamper_func("incremental")),
+    ]
+
+    print(f"{'halaman':>8} {'implementasi':<14} {'waktu (ms)':>11} {'memori puncak (KB)':>19} "
+          f"{'ukuran (KB)':>12} {'4 tahap (KB)':>13}")
+    for pages in args.pages:
+        pdf_bytes = make_pdf(pages)
+        for name, func in implementations:
+            duration, peak, size = measure(func, pdf_bytes, data_url, args.repeat)
+            staged = stage_growth(func, pdf_bytes, data_url)
+            print(f"{pages:>8} {name:<14} {duration * 1000:>11.1f} {peak / 1024:>19.0f} "
+                  f"{size / 1024:>12.1f} {staged / 1024:>13.1f}")
+        print(f"{'':>8} {'(asli)':<14} {'':>11} {'':>19} {len(pdf_bytes) / 1024:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark skala penempelan tanda tangan: mode thread vs pool proses.
+
+Untuk setiap jumlah pekerja N, N thread menempelkan tanda tangan ke PDF
+secara bersamaan, sekali lewat SIGNATURE_STAMPER di thread (tertahan GIL),
+sekali lewat StampProcessPool dengan N proses (PDF_STAMP_EXECUTOR=process).
+Dilaporkan throughput (dokumen/detik) dan percepatan relatif terhadap N=1.
+
+    python bench/bench_stamp_pool.py
+    python bench/bench_stamp_pool.py --workers 1 2 4 8 --pages 200 --jobs 64
+"""
+import argparse
+import io
+import os
+import threading
+import time
+
+from _common import load_app, make_pdf, make_signature_png
+
+app = load_app()
+
+
+def run(stamp, workers, jobs, pdf_bytes, signature):
+    """Menjalankan `jobs` penempelan dengan `workers` thread; mengembalikan dokumen/detik."""
+    remaining = [jobs]
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if not remaining[0]:
+                    return
+                remaining[0] -= 1
+            stamp(io.BytesIO(pdf_bytes), signature)
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return jobs / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    cores = os.cpu_count() or 1
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, 4, cores} & set(range(1, cores + 1))))
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--jobs", type=int, default=32, help="jumlah dokumen per pengukuran")
+    parser.add_argument("--mode", choices=["incremental", "rewrite"], default="rewrite",
+                        help="mode penyimpanan PDF (rewrite paling berat di CPU)")
+    args = parser.parse_args()
+
+    pdf_bytes = make_pdf(args.pages)
+    signature = app.SIGNATURE_STORE.normalize(make_signature_png())
+    stamper = app.SignatureStamper(mode=args.mode)
+    stamper.stamp(io.BytesIO(pdf_bytes), signature)
+
+    print(f"{cores} CPU, PDF {args.pages} halaman ({len(pdf_bytes) / 1024:.0f} KB), "
+          f"mode {args.mode}, {args.jobs} dokumen per pengukuran")
+    print(f"  {'pekerja':>7}  {'thread dok/s':>12}  {'x':>5}  {'proses dok/s':>12}  {'x':>5}")
+    base = {}
+    for workers in args.workers:
+        pool = app.StampProcessPool(workers, timeout=300, memory_mb=0, temp_dir=os.path.join(app.TEMP_DIR, "stamp"), mode=args.mode)
+        try:
+            # Proses anak dinyalakan (impor app.py dan library PDF) sebelum pengukuran
+            run(pool.stamp, workers, workers, pdf_bytes, signature)
+            results = {
+                "thread": run(stamper.stamp, workers, args.jobs, pdf_bytes, signature),
+                "process": run(pool.stamp, workers, args.jobs, pdf_bytes, signature),
+            }
+        finally:
+            pool.shutdown()
+        for kind, value in results.items():
+            base.setdefault(kind, value)
+        print(f"  {workers:>7}  {results['thread']:12.1f}  {results['thread'] / base['thread']:5.2f}"
+              f"  {results['process']:12.1f}  {results['process'] / base['process']:5.2f}")
+
+
+if __name__ == "__main__":
+    main()
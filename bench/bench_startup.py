@@ -0,0 +1,101 @@
+"""Benchmark cold start: impor app.py sampai respons pertama.
+
+Setiap percobaan berjalan di proses Python baru (seperti worker gunicorn yang
+baru di-spawn) dan mengukur:
+  - import: waktu `import app`
+  - first_response: GET /preview_file/<id> pertama (tanpa akses Drive)
+  - first_stamp: penempelan tanda tangan pertama (library PDF dimuat di sini
+    jika belum dimuat saat impor)
+  - warmup: waktu app.warmup() jika --warmup dipakai (dijalankan sebelum
+    respons pertama, seperti hook post_worker_init)
+
+    python bench/bench_startup.py
+    python bench/bench_startup.py --repeat 10 --warmup
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def child(warmup, sample_path):
+    with open(sample_path) as f:
+        sample = json.load(f)
+    pdf_bytes = base64.b64decode(sample["pdf"])
+
+    start = time.perf_counter()
+    sys.path.insert(0, BENCH_DIR)
+    from _common import load_app
+
+    app = load_app()
+    result = {"import": time.perf_counter() - start}
+
+    if warmup:
+        begin = time.perf_counter()
+        app.warmup()
+        result["warmup"] = time.perf_counter() - begin
+
+    client = app.app.test_client()
+    begin = time.perf_counter()
+    response = client.get("/preview_file/bench-file?folder_id=folder-02a&folder=02A%20-%20SPV%20HRGA")
+    result["first_response"] = time.perf_counter() - begin
+    result["status"] = response.status_code
+    result["import_to_first_response"] = time.perf_counter() - start
+
+    begin = time.perf_counter()
+    app.add_signature_to_pdf(io.BytesIO(pdf_bytes), sample["signature"])
+    result["first_stamp"] = time.perf_counter() - begin
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", action="store_true", help="panggil app.warmup() sebelum respons pertama")
+    parser.add_argument("--child", metavar="SAMPLE", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.warmup, args.child)
+        return
+
+    # Contoh PDF dan tanda tangan dibuat di proses induk agar proses anak
+    # tidak memuat reportlab/Pillow sebelum mengimpor app.py
+    sys.path.insert(0, BENCH_DIR)
+    from _common import make_pdf, signature_data_url
+
+    sample = tempfile.NamedTemporaryFile("w", suffix=".json", delete=False)
+    with sample:
+        json.dump({"pdf": base64.b64encode(make_pdf(1)).decode(), "signature": signature_data_url()}, sample)
+
+    command = [sys.executable, os.path.abspath(__file__), "--child", sample.name]
+    if args.warmup:
+        command.append("--warmup")
+
+    runs = []
+    try:
+        for _ in range(args.repeat):
+            output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+    finally:
+        os.remove(sample.name)
+
+    print(f"{args.repeat} proses baru, warmup={'ya' if args.warmup else 'tidak'} (median, ms)")
+    for key in ("import", "warmup", "first_response", "import_to_first_response", "first_stamp"):
+        samples = [run[key] for run in runs if key in run]
+        if samples:
+            print(f"  {key:<26} {statistics.median(samples) * 1000:8.1f}")
+    statuses = sorted({run["status"] for run in runs})
+    print(f"  status respons pertama: {statuses}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""Backend Google Drive palsu untuk benchmark dan uji beban lokal.
+
+FakeDrive menyimpan file di memori dan menjawab request HTTP Drive v3 yang
+dipakai app.py: files.list (dengan q per folder dan pageToken), files.get,
+files.get_media (dengan header Range), files.create dan files.update
+(metadata dan upload resumable), files.delete, changes.getStartPageToken,
+changes.list, serta batch request. Latensi jaringan disimulasikan per request.
+
+Layanan dibangun dengan googleapiclient asli di atas transport palsu, sehingga
+MediaIoBaseDownload, upload resumable, batch, dan DRIVE_CALLS ikut teruji:
+
+    backend = FakeDrive(latency=0.05)
+    backend.add_file("folder-02a", "01 SR-a dokumen.pdf", make_pdf(3))
+    install(app, backend)   # menggantikan drive_service_sa (satu layanan per thread)
+"""
+import hashlib
+import itertools
+import json
+import random
+import threading
+import time
+import urllib.parse
+import uuid
+from datetime import datetime, timezone
+
+import httplib2
+
+_discovery = None
+_discovery_lock = threading.Lock()
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def _select(item, fields):
+    """Menerapkan field mask sederhana ("id, name" atau "files(id, name)") pada satu objek."""
+    if not fields:
+        return dict(item)
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    return {key: item[key] for key in names if key in item}
+
+
+def _inner_fields(fields, collection):
+    """Mengambil isi "files(...)" atau "changes(...)" dari field mask daftar."""
+    if not fields:
+        return None
+    marker = collection + "("
+    start = fields.find(marker)
+    if start < 0:
+        return None
+    depth, position = 1, start + len(marker)
+    while depth and position < len(fields):
+        depth += {"(": 1, ")": -1}.get(fields[position], 0)
+        position += 1
+    return fields[start + len(marker):position - 1]
+
+
+class FakeDrive:
+    """Penyimpanan file Drive di memori yang aman dipakai dari banyak thread."""
+
+    def __init__(self, latency=0.0, jitter=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.files = {}
+        self.content = {}
+        self.changes = []
+        self.request_counts = {}
+        self._uploads = {}
+        self._ids = itertools.count(1)
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+
+    # --- Data awal dan inspeksi ---
+
+    def add_file(self, parent, name, data, mime_type="application/pdf", file_id=None):
+        """Menambahkan file ke folder parent dan mengembalikan metadata-nya."""
+        with self._lock:
+            file_id = file_id or f"fake-{next(self._ids)}"
+            self.files[file_id] = {"id": file_id, "name": name, "parents": [parent], "mimeType": mime_type}
+            self._set_content(file_id, data)
+            return dict(self.files[file_id])
+
+    def list_folder(self, parent):
+        with self._lock:
+            return [dict(f) for f in self.files.values() if parent in f["parents"]]
+
+    def service(self):
+        """Layanan Drive v3 (googleapiclient) dengan transport palsu; satu per thread."""
+        from googleapiclient.discovery import build_from_document
+        from googleapiclient.discovery_cache import get_static_doc
+
+        global _discovery
+        with _discovery_lock:
+            if _discovery is None:
+                _discovery = json.loads(get_static_doc("drive", "v3"))
+        return build_from_document(_discovery, http=FakeDriveHttp(self))
+
+    def _set_content(self, file_id, data):
+        self.content[file_id] = bytes(data)
+        self.files[file_id].update({
+            "size": str(len(data)),
+            "md5Checksum": hashlib.md5(data).hexdigest(),
+            "modifiedTime": _now(),
+        })
+
+    def _record_change(self, file_id, removed=False):
+        change = {"fileId": file_id, "removed": removed}
+        if not removed:
+            change["file"] = dict(self.files[file_id], trashed=False)
+        self.changes.append(change)
+
+    def _count(self, name):
+        self.request_counts[name] = self.request_counts.get(name, 0) + 1
+
+    def _sleep(self):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter)))
+
+    # --- Penanganan request ---
+
+    def handle(self, method, uri, body=None, headers=None):
+        """Menjawab satu request HTTP Drive; mengembalikan (status, header, isi)."""
+        headers = {key.lower(): value for key, value in (headers or {}).items()}
+        parsed = urllib.parse.urlsplit(uri)
+        query = dict(urllib.parse.parse_qsl(parsed.query))
+        path = parsed.path
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        with self._lock:
+            if path.startswith("/upload-session/"):
+                return self._upload_chunk(path.rsplit("/", 1)[1], body or b"", headers)
+            if path.endswith("/changes/startPageToken"):
+                self._count("changes.getStartPageToken")
+                return self._json({"startPageToken": str(len(self.changes))})
+            if path.endswith("/changes"):
+                self._count("changes.list")
+                return self._list_changes(query)
+            if path.startswith("/upload/drive/v3/files"):
+                file_id = path[len("/upload/drive/v3/files/"):] or None
+                return self._start_upload(method, file_id, query, body, headers)
+            if path == "/drive/v3/files" and method == "GET":
+                self._count("files.list")
+                return self._list_files(query)
+            if path == "/drive/v3/files" and method == "POST":
+                self._count("files.create")
+                return self._create(json.loads(body or b"{}"), b"", query)
+            if path.startswith("/drive/v3/files/"):
+                file_id = urllib.parse.unquote(path[len("/drive/v3/files/"):])
+                if file_id not in self.files:
+                    return self._error(404, f"File not found: {file_id}.")
+                if method == "GET" and query.get("alt") == "media":
+                    self._count("files.get_media")
+                    return self._media(file_id, headers.get("range"))
+                if method == "GET":
+                    self._count("files.get")
+                    return self._json(_select(self.files[file_id], query.get("fields")))
+                if method == "PATCH":
+                    self._count("files.update")
+                    return self._update(file_id, json.loads(body or b"{}"), None, query)
+                if method == "DELETE":
+                    self._count("files.delete")
+                    del self.files[file_id]
+                    del self.content[file_id]
+                    self._record_change(file_id, removed=True)
+                    return 204, {}, b""
+        return self._error(400, f"Request tidak didukung: {method} {path}")
+
+    def _list_files(self, query):
+        parent = query.get("q", "").split("'")[1] if "'" in query.get("q", "") else None
+        items = [f for f in self.files.values() if parent is None or parent in f["parents"]]
+        start = int(query.get("pageToken") or 0)
+        size = int(query.get("pageSize") or 100)
+        fields = _inner_fields(query.get("fields"), "files")
+        result = {"files": [_select(f, fields) for f in items[start:start + size]]}
+        if start + size < len(items):
+            result["nextPageToken"] = str(start + size)
+        return self._json(result)
+
+    def _list_changes(self, query):
+        start = int(query["pageToken"])
+        size = int(query.get("pageSize") or 100)
+        page = self.changes[start:start + size]
+        result = {"changes": page}
+        if start + size < len(self.changes):
+            result["nextPageToken"] = str(start + size)
+        else:
+            result["newStartPageToken"] = str(len(self.changes))
+        return self._json(result)
+
+    def _media(self, file_id, range_header):
+        data = self.content[file_id]
+        if not range_header:
+            return 200, {"content-length": str(len(data))}, data
+        first, last = range_header.split("=", 1)[1].split("-")
+        first, last = int(first), min(int(last), len(data) - 1)
+        return 206, {"content-range": f"bytes {first}-{last}/{len(data)}"}, data[first:last + 1]
+
+    def _create(self, metadata, data, query):
+        file_id = f"fake-{next(self._ids)}"
+        self.files[file_id] = {
+            "id": file_id,
+            "name": metadata.get("name", "Untitled"),
+            "parents": list(metadata.get("parents", [])),
+            "mimeType": metadata.get("mimeType", "application/pdf"),
+        }
+        self._set_content(file_id, data)
+        self._record_change(file_id)
+        return self._json(_select(self.files[file_id], query.get("fields")))
+
+    def _update(self, file_id, metadata, data, query):
+        file = self.files[file_id]
+        if "name" in metadata:
+            file["name"] = metadata["name"]
+        removed = set(filter(None, query.get("removeParents", "").split(",")))
+        file["parents"] = [p for p in file["parents"] if p not in removed]
+        for parent in filter(None, query.get("addParents", "").split(",")):
+            if parent not in file["parents"]:
+                file["parents"].append(parent)
+        if data is not None:
+            self._set_content(file_id, data)
+        else:
+            file["modifiedTime"] = _now()
+        self._record_change(file_id)
+        return self._json(_select(file, query.get("fields")))
+
+    def _start_upload(self, method, file_id, query, body, headers):
+        if file_id and file_id not in self.files:
+            return self._error(404, f"File not found: {file_id}.")
+        self._count("files.update" if file_id else "files.create")
+        if query.get("uploadType") != "resumable":
+            return self._error(400, "Hanya uploadType=resumable yang didukung.")
+        session = uuid.uuid4().hex
+        self._uploads[session] = {
+            "file_id": file_id,
+            "metadata": json.loads(body or b"{}"),
+            "query": query,
+            "size": int(headers.get("x-upload-content-length", 0) or 0),
+            "data": bytearray(),
+        }
+        return 200, {"location": f"https://www.googleapis.com/upload-session/{session}"}, b""
+
+    def _upload_chunk(self, session, chunk, headers):
+        upload = self._uploads.get(session)
+        if upload is None:
+            return self._error(404, "Sesi upload tidak ditemukan.")
+        content_range = headers.get("content-range", "")
+        total = content_range.rsplit("/", 1)[-1]
+        if not content_range.startswith("bytes */"):
+            first = int(content_range.split(" ", 1)[1].split("-", 1)[0])
+            # Chunk yang dikirim ulang setelah error ditimpa dari posisi awalnya
+            del upload["data"][first:]
+            upload["data"].extend(chunk)
+        if total != "*" and len(upload["data"]) >= int(total):
+            del self._uploads[session]
+            data = bytes(upload["data"])
+            if upload["file_id"]:
+                return self._update(upload["file_id"], upload["metadata"], data, upload["query"])
+            return self._create(upload["metadata"], data, upload["query"])
+        response_headers = {}
+        if upload["data"]:
+            response_headers["range"] = f"bytes=0-{len(upload['data']) - 1}"
+        return 308, response_headers, b""
+
+    @staticmethod
+    def _json(payload, status=200):
+        return status, {"content-type": "application/json; charset=UTF-8"}, json.dumps(payload).encode()
+
+    @classmethod
+    def _error(cls, status, message):
+        return cls._json({"error": {"code": status, "message": message, "errors": [{"message": message}]}}, status)
+
+
+class FakeDriveHttp:
+    """Pengganti httplib2.Http yang meneruskan request ke FakeDrive (termasuk batch multipart)."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=None, connection_type=None):
+        self.backend._sleep()
+        if hasattr(body, "read"):
+            # Chunk upload resumable dikirim sebagai potongan stream
+            body = body.read()
+        if urllib.parse.urlsplit(uri).path.startswith("/batch/"):
+            with self.backend._lock:
+                self.backend._count("batch")
+            return self._batch(body, headers or {})
+        status, response_headers, content = self.backend.handle(method, uri, body, headers)
+        return httplib2.Response(dict(response_headers, status=str(status))), content
+
+    def _batch(self, body, headers):
+        from email.parser import Parser
+
+        content_type = {k.lower(): v for k, v in headers.items()}["content-type"]
+        message = Parser().parsestr(f"Content-Type: {content_type}\r\n\r\n{body}")
+        boundary = f"batch_{uuid.uuid4().hex}"
+        parts = []
+        for part in message.get_payload():
+            request_line, _, rest = part.get_payload().partition("\n")
+            method, path, _ = request_line.strip().split(" ", 2)
+            request_headers, _, request_body = rest.replace("\r\n", "\n").partition("\n\n")
+            header_map = dict(line.split(": ", 1) for line in request_headers.splitlines() if ": " in line)
+            status, response_headers, content = self.backend.handle(
+                method, "https://www.googleapis.com" + path, request_body or None, header_map
+            )
+            lines = [f"HTTP/1.1 {status} OK"]
+            lines += [f"{key}: {value}" for key, value in response_headers.items()]
+            parts.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{part['Content-ID'][1:-1]}>\r\n\r\n"
+                + "\r\n".join(lines) + "\r\n\r\n" + content.decode("utf-8") + "\r\n"
+            )
+        payload = "".join(parts) + f"--{boundary}--\r\n"
+        response = httplib2.Response({"status": "200", "content-type": f"multipart/mixed; boundary={boundary}"})
+        return response, payload.encode("utf-8")
+
+
+def install(app_module, backend):
+    """Mengganti layanan Drive akun layanan di app.py dengan layanan FakeDrive per thread."""
+    app_module.drive_service_sa = app_module.ThreadLocalDriveService(backend.service)
+    app_module.DRIVE_INDEX._service_factory = backend.service
+    return backend
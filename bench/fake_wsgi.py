@@ -0,0 +1,23 @@
+"""Entry WSGI untuk uji beban gunicorn: app.py dengan Drive palsu (lihat bench_serving.py).
+
+    gunicorn -c gunicorn.conf.py --chdir bench fake_wsgi:application
+
+FAKE_DRIVE_LATENCY (detik) dan FAKE_DRIVE_FILES (file per folder) mengatur Drive palsu.
+Setiap worker gunicorn punya Drive palsu sendiri dengan isi dan ID file yang sama.
+"""
+import os
+
+from _common import load_app, make_pdf
+
+app = load_app()
+
+from fake_drive import FakeDrive, install
+
+backend = FakeDrive(latency=float(os.getenv("FAKE_DRIVE_LATENCY", "0.1")), seed=1)
+_sample_pdf = make_pdf(1)
+for _folder_id in app.FOLDERS.values():
+    for _number in range(int(os.getenv("FAKE_DRIVE_FILES", "20"))):
+        backend.add_file(_folder_id, f"01 SR-x dokumen {_number}.pdf", _sample_pdf)
+install(app, backend)
+
+application = app.app
@@ -0,0 +1,24 @@
+# Konfigurasi gunicorn, dibaca otomatis dari direktori kerja saat `gunicorn app:app` dijalankan
+import os
+import threading
+
+# Mode worker: "gthread" (bawaan, satu thread per request yang sedang berjalan) atau "gevent"
+# (satu greenlet per request; request yang sedang menunggu Drive tidak menahan worker, sehingga
+# satu worker melayani hingga GUNICORN_WORKER_CONNECTIONS koneksi bersamaan)
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "1000"))
+
+if worker_class == "gevent":
+    # Di gevent, kerja CPU di greenlet menahan semua request lain di worker yang sama,
+    # jadi penempelan tanda tangan dipindah ke pool proses kecuali diatur lain
+    os.environ.setdefault("PDF_STAMP_EXECUTOR", "process")
+
+
+def post_worker_init(worker):
+    """Menjalankan app.warmup() di latar belakang agar worker langsung menerima request."""
+    import app
+
+    if app.WARMUP_ON_START:
+        threading.Thread(target=app.warmup, name="warmup", daemon=True).start()